@@ -0,0 +1,24 @@
+import pytest
+
+vs = pytest.importorskip('vapoursynth')
+pytest.importorskip('vstools')
+pytest.importorskip('pandas')
+
+from vsmetrics import GLCM
+
+core = vs.core
+
+
+@pytest.fixture(scope='module')
+def clip() -> vs.VideoNode:
+    return core.std.BlankClip(format=vs.RGBS, width=64, height=48, length=3, color=[0.2, 0.5, 0.8])
+
+
+def test_print_statistics_uses_per_plane_props(clip, capsys):
+    node = GLCM(levels=32).calculate(clip, planes=[0, 1, 2])
+    node.print_statistics()
+
+    output = capsys.readouterr().out
+
+    for channel in 'rgb':
+        assert f'Statistics for texture_contrast_{channel}:' in output
@@ -0,0 +1,45 @@
+import pytest
+
+vs = pytest.importorskip('vapoursynth')
+pytest.importorskip('vstools')
+
+from vsmetrics import Blur, Sharpness
+
+core = vs.core
+
+if not hasattr(core, 'akarin'):
+    pytest.skip('the native backends need akarin', allow_module_level=True)
+
+
+@pytest.fixture(scope='module')
+def clip() -> vs.VideoNode:
+    # smooth gradients for the blur, plus a per-pixel hash so there is fine detail to lose
+    blank = core.std.BlankClip(format=vs.GRAYS, width=320, height=240, length=4)
+    return blank.akarin.Expr(
+        'X 0.05 * N + sin Y 0.07 * cos * 0.25 * 0.5 + '
+        'X 12.9898 * Y 78.233 * + N + sin 43758.5453 * dup floor - 0.2 * +'
+    )
+
+
+def _scores(node, prop: str) -> list[float]:
+    return [frame.props[prop] for frame in node.frames()]
+
+
+def test_sharpness_native_matches_opencv(clip):
+    pytest.importorskip('cv2')
+
+    native = _scores(Sharpness(native=True).calculate(clip), 'sharpness')
+    reference = _scores(Sharpness(native=False).calculate(clip), 'sharpness')
+
+    assert native == pytest.approx(reference, rel=1e-4)
+
+
+def test_blur_native_matches_skimage(clip):
+    pytest.importorskip('skimage')
+
+    native = _scores(Blur(native=True).calculate(clip), 'blur')
+    reference = _scores(Blur(native=False).calculate(clip), 'blur')
+
+    # akarin mirrors the frame edges where scipy reflects them, which only the 11-tap box blur
+    # near the borders sees; the scores differ by up to about 0.5%
+    assert native == pytest.approx(reference, rel=1e-2)
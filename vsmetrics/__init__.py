@@ -1,14 +1,51 @@
-from .util import *
-from .data import *
-from .func import *
-from .vmaf import *
-from .good import *
-from .club import *
-from .hash import *
-from .blur import *
-from .meta import *
-
-from .colour import *
-from .visual import *
-from .simple import *
-from .beacon import *
\ No newline at end of file
+from importlib import import_module
+
+# submodules are only imported when one of their names is first accessed,
+# so e.g. a PSNR-only script never pays for torch, OpenCV or skimage
+_EXPORTS: dict[str, tuple[str, ...]] = {
+    'util': ('name', 'convet_model', 'ReductionMode', 'pre_process'),
+    'data': ('CSVHandler', 'ParquetHandler'),
+    'func': ('compare', 'frame_signatures', 'find_offset', 'apply_offset', 'find_desync', 'apply_frame_map', 'banding_mask'),
+    'vmaf': ('VMAFMetric', 'PSNRHVS', 'MSSSIM', 'CIEDE2000', 'CAMBI', 'VMAF'),
+    'good': ('SSIMULACRA', 'BUTTERAUGLI'),
+    'club': ('GMSD', 'SSIM', 'MDSI', 'PSNR', 'WADIQAM'),
+    'hash': ('Hash_3117', 'HashIndex'),
+    'blur': ('VIF', 'Blur', 'LocaLBinaryPattern', 'GLCM', 'Sharpness', 'BRISQUE', 'SVD'),
+    'meta': (
+        'set_async_requests', 'set_score_cache', 'resolve_async_requests', 'collect_props', 'read_results',
+        'validate_format', 'BaseUtil', 'MetricVideoNode', 'metric_params', 'metric_props', 'MetricGroup',
+        'MultiMetricVideoNode',
+    ),
+    'cache': ('ScoreCache',),
+    'models': ('get_model', 'preload_models', 'release_models', 'loaded_models'),
+    'pool': ('ProcessPool',),
+    'visual': ('VisualizeDiffs', 'ColorMap'),
+    'simple': (
+        'Edge', 'NoReferenceStatistics', 'FullReferenceStatistics', 'MetricsWrapper', 'NoReferenceWrapper',
+        'FullReferenceWrapper', 'Mean', 'MAD', 'Variance', 'StandardDeviation', 'RMS', 'MAE', 'RMSE', 'Covariance',
+        'Correlation',
+    ),
+    'beacon': ('LPIPS',),
+    'enums': ('MatrixFMTC', 'PrimariesFMTC', 'TransferFMTC', 'ColormapTypes', 'ColourSpace'),
+}
+
+_LOOKUP = {attr: module for module, attrs in _EXPORTS.items() for attr in attrs}
+
+__all__ = list(_LOOKUP)
+
+
+def __getattr__(attr: str):
+    if attr in _EXPORTS or attr == 'colour':
+        return import_module(f'.{attr}', __name__)
+
+    module = _LOOKUP.get(attr)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+    value = getattr(import_module(f'.{module}', __name__), attr)
+    globals()[attr] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
\ No newline at end of file
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+from vstools import vs
+
+# Frame <-> NumPy helpers for the metrics that score frames in Python.
+# Planes are exposed as views of the frame's memory, and every conversion
+# writes into a buffer owned by the calling thread, so the per-frame
+# hot loops allocate nothing once the buffers exist.
+
+_local = threading.local()
+
+
+def read_plane(frame: vs.VideoFrame, plane: int) -> NDArray:
+    """Returns a read-only view of one plane of a frame. Nothing is copied."""
+    array = np.asarray(frame[plane])
+    array.flags.writeable = False
+    return array
+
+
+def read_planes(frames: list[vs.VideoFrame], planes: list[int]) -> list[NDArray]:
+    """Returns read-only views of the given planes of each frame, frame by frame."""
+    return [read_plane(frame, plane) for frame in frames for plane in planes]
+
+
+def write_plane(frame: vs.VideoFrame, plane: int, array: NDArray) -> None:
+    """Copies an array into a plane of a writable frame, converting to the plane's sample type."""
+    np.copyto(np.asarray(frame[plane]), array, casting='unsafe')
+
+
+def scratch(name: str, shape: tuple[int, ...], dtype: DTypeLike = np.float32) -> NDArray:
+    """
+    Returns a buffer owned by the calling thread, reused on every call with the same name, shape and type.
+    Its contents are undefined; it is valid until the same thread asks for the same buffer again.
+    """
+    buffers = _local.__dict__.setdefault('buffers', {})
+    key = (name, shape, np.dtype(dtype).str)
+
+    buffer = buffers.get(key)
+
+    if buffer is None:
+        buffer = buffers[key] = np.empty(shape, dtype=dtype)
+
+    return buffer
+
+
+def as_dtype(plane: NDArray, dtype: DTypeLike, name: str) -> NDArray:
+    """Returns the plane itself if it already has the given type, else a converted copy in scratch memory."""
+    if plane.dtype == dtype:
+        return plane
+
+    out = scratch(name, plane.shape, dtype)
+    np.copyto(out, plane, casting='unsafe')
+    return out
+
+
+def to_uint8(plane: NDArray, name: str = 'uint8') -> NDArray[np.uint8]:
+    """
+    Scales a 0-1 float plane to 8 bits in scratch memory, truncating like ``(plane * 255).astype(np.uint8)``.
+    """
+    scaled = scratch(f'{name}_scaled', plane.shape, np.float32)
+    np.multiply(plane, 255, out=scaled)
+
+    out = scratch(name, plane.shape, np.uint8)
+    np.copyto(out, scaled, casting='unsafe')
+    return out
@@ -1,5 +1,4 @@
 import torch
-import lpips
 
 from enum import Enum
 import numpy as np
@@ -8,6 +7,8 @@ from numpy.typing import NDArray
 from vstools import vs, core
 from .util import validate_format
 from .meta import BaseUtil, MetricVideoNode
+from .models import get_model
+from .arrays import read_planes, scratch
 
 class LPIPS(BaseUtil):
     props: list[str] = ["lpips"]
@@ -20,9 +21,29 @@ class LPIPS(BaseUtil):
         VGG = 'vgg'
         SQUEEZE = 'squeeze'
 
-    def __init__(self, network: Network = Network.ALEX):
+    def __init__(self, network: Network = Network.ALEX, batch_size: int = 1, threads: int | None = None):
+        """
+        :param network:     Backbone of the LPIPS model.
+        :param batch_size:  Number of frame pairs scored per forward pass.
+        :param threads:     Intra-op thread count handed to torch. None keeps torch's default.
+        """
         self.network = network.value
-        self.loss_fn_alex = lpips.LPIPS(net=self.network)
+        self.batch_size = batch_size
+        self.threads = threads
+
+    @property
+    def model_key(self) -> tuple:
+        return ('lpips', self.network)
+
+    @property
+    def model(self):
+        """The LPIPS network, loaded once per process and shared by every instance."""
+        return get_model(self.model_key, self._load_model)
+
+    def _load_model(self):
+        import lpips
+
+        return lpips.LPIPS(net=self.network)
 
     def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
         validate_format(reference, self.formats)
@@ -31,26 +52,85 @@ class LPIPS(BaseUtil):
         reference = reference.std.Limiter(0, 1)
         distorted = distorted.std.Limiter(0, 1)
 
-        clip = reference.std.ModifyFrame([reference, distorted], self._process_frame)
-        return MetricVideoNode(clip, self)
+        self.planes = [0, 1, 2]
+
+        if self.threads is not None:
+            torch.set_num_threads(self.threads)
+
+        if self.batch_size > 1:
+            clip = self._batched(reference, distorted)
+        else:
+            clip = reference.std.ModifyFrame([reference, distorted], self._process_frame)
+
+        return MetricVideoNode(clip, self, inputs=[reference, distorted])
+
+    def _batched(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> vs.VideoNode:
+        """
+        Frame b of the k-th selected clip is frame ``b * batch_size + k``, so one ModifyFrame call
+        sees a whole batch. Its scores are stored as an array prop and handed back out per frame.
+        """
+        size = self.batch_size
+        batches = -(-reference.num_frames // size)
+
+        def _select(clip: vs.VideoNode, k: int) -> vs.VideoNode:
+            if k >= clip.num_frames:
+                return clip[-1] * batches
+
+            selected = clip.std.SelectEvery(size, k)
+
+            # pad the last, partial batch by repeating the final frame
+            if selected.num_frames < batches:
+                selected = selected + clip[-1] * (batches - selected.num_frames)
+
+            return selected
 
-    def _process_frame(self, n: int, f: list[vs.VideoFrame]) -> vs.VideoFrame:
+        references = [_select(reference, k) for k in range(size)]
+        distorteds = [_select(distorted, k) for k in range(size)]
+
+        scores = references[0].std.ModifyFrame([*references, *distorteds], self._process_batch)
+        scores = core.std.Interleave([scores] * size)[:reference.num_frames]
+
+        return reference.std.ModifyFrame([reference, scores], self._unbatch)
+
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        score = self._metric(self._to_tensor([arrays[:3]], 'reference'), self._to_tensor([arrays[3:]], 'distorted'))
+        return {self.props[0]: float(score[0])}
+
+    def _process_batch(self, n: int, f: list[vs.VideoFrame]) -> vs.VideoFrame:
+        size = self.batch_size
+        fout = f[0].copy()
+
+        images = [read_planes([frame], self.planes) for frame in f]
+        scores = self._metric(self._to_tensor(images[:size], 'reference'), self._to_tensor(images[size:], 'distorted'))
+        fout.props['_lpips_batch'] = scores.tolist()
+
+        return fout
+
+    def _unbatch(self, n: int, f: list[vs.VideoFrame]) -> vs.VideoFrame:
         f1, f2 = f
         fout = f1.copy()
 
-        arr1 = np.asarray(f1)
-        arr2 = np.asarray(f2)
-
-        blur_score = self._metric(arr1, arr2)
-        fout.props[self.props[0]] = float(blur_score)
+        fout.props[self.props[0]] = float(f2.props['_lpips_batch'][n % self.batch_size])
 
         return fout
 
-    def _metric(self, reference: NDArray, distorted: NDArray) -> float:
-        reference = torch.from_numpy(reference).float().div(255).sub(0.5).div(0.5)
-        distorted = torch.from_numpy(distorted).float().div(255).sub(0.5).div(0.5)
+    @staticmethod
+    def _to_tensor(images: list[list[NDArray]], name: str) -> torch.Tensor:
+        """
+        Stacks RGB plane triplets into one NCHW tensor, rescaled from 0-1 to the -1-1 range LPIPS expects.
+        The tensor shares the calling thread's scratch memory, so it is only valid until the next call.
+        """
+        height, width = images[0][0].shape
+        batch = scratch(f'lpips_{name}', (len(images), len(images[0]), height, width), np.float32)
+
+        for i, planes in enumerate(images):
+            for plane, array in enumerate(planes):
+                np.copyto(batch[i, plane], array)
+
+        return torch.from_numpy(batch).mul_(2).sub_(1)
 
-        data = self.loss_fn_alex(reference, distorted)
-        data = data.item()
+    def _metric(self, reference: torch.Tensor, distorted: torch.Tensor) -> NDArray:
+        with torch.inference_mode():
+            data = self.model(reference, distorted)
 
-        return data
+        return data.reshape(-1).numpy()
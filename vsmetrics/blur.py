@@ -1,40 +1,13 @@
 from enum import Enum
-import cv2
+import os
 import numpy as np
 from vstools import vs, core
 from .util import validate_format
 from .meta import BaseUtil, MetricVideoNode
-from skimage.measure import blur_effect
-from skimage.feature import local_binary_pattern
-from skimage.feature import graycomatrix, graycoprops
-from scipy.ndimage import gaussian_filter
-from typing import Any
+from .models import get_model
+from .arrays import as_dtype, read_plane, scratch, to_uint8, write_plane
 from numpy.typing import NDArray
 
-#import numpy
-#class NumpyHelper():
-#    def get_read_array(self, index) -> NDArray:
-#        return numpy.asarray(self[index])
-#
-#    def get_write_array(self, index) -> NDArray:
-#        if not self.f:
-#            raise Error("frame is not writable")
-#        return self.get_read_array(index)
-#    
-#    def frame_to_array(self, f: vs.VideoFrame) -> NDArray[Any]:
-#        return np.dstack([self.get_read_array(f[i]) for i in range(f.format.num_planes)]) 
-#
-#    def array_to_frame(self, array: NDArray[Any], frame: vs.VideoFrame) -> vs.VideoFrame:
-#        fout = frame.copy()
-#
-#        for plane in range(fout.format.num_planes):
-#            np.copyto(
-#                np.asarray(fout[plane]),
-#                array[plane, ...]
-#            )
-#
-#        return fout
-
 class VIF(BaseUtil):
     props: list[str] = ["VIF"]
     formats: tuple[int, ...] = (
@@ -42,29 +15,49 @@ class VIF(BaseUtil):
     )
 
     def __init__(self):
+        from scipy.ndimage import gaussian_filter
+
         self.gaussian_filter = gaussian_filter
 
-    def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
+    def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode, planes: list[int] | int | None = None) -> vs.VideoNode | MetricVideoNode:
+        """
+        VIF pooled over the requested planes as ``VIF``, plus the VIF of every plane (``VIF_r``, ``VIF_g``, ``VIF_b``).
+        """
         validate_format(reference, self.formats)
+        validate_format(distorted, self.formats)
+
+        if planes is None:
+            planes = list(range(reference.format.num_planes))  # type: ignore
+
+        self.planes = self._normalise_planes(planes)
+        self.props = [*VIF.props, *self._generate_props(VIF.props, reference.format.color_family, self.planes)]  # type: ignore
 
         clip = reference.std.ModifyFrame([reference, distorted], self._process_frame)
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference, distorted])
 
-    def _process_frame(self, n: int, f: list[vs.VideoFrame]) -> vs.VideoFrame:
-        f1, f2 = f
-        fout = f1.copy()
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        count = len(self.planes)
+        props = {}
 
-        arr1 = np.asarray(f1[0])
-        arr2 = np.asarray(f2[0])
+        num, den = 0.0, 0.0
 
-        difference = self._vif(arr1, arr2)
+        for prop, reference, distorted in zip(self.props[1:], arrays[:count], arrays[count:]):
+            plane_num, plane_den = self._vif(reference, distorted)
+            props[prop] = plane_num / plane_den
 
-        fout.props[self.props[0]] = float(difference)
+            num += plane_num
+            den += plane_den
 
-        return fout
-    
-    def _vif(self, reference: NDArray, distorted: NDArray):
-        sigma_nsq = 0.5
+        props[self.props[0]] = num / den
+
+        return props
+
+    def _vif(self, reference: NDArray, distorted: NDArray) -> tuple[float, float]:
+        """
+        Returns the numerator and denominator of the VIF of one plane, so planes can be pooled.
+
+        Runs in float32 on per-thread buffers that are reused from frame to frame.
+        """
         eps = 1e-5
 
         num = 0.0
@@ -73,44 +66,109 @@ class VIF(BaseUtil):
         for scale in range(1, 5):
             N = 2**(4-scale+1) + 1
             sd, t = N/3.0, 1.4  # kernel radius = round(sd * truncate)
-
-            if scale == 2:
-                sigma_nsq = .1
+            sigma_nsq = 0.5 if scale == 1 else 0.1
 
             if scale > 1:
-                reference = self.gaussian_filter(reference, 1.08, truncate=1.5)[::2, ::2]
-                distorted = self.gaussian_filter(distorted, 1.08, truncate=1.5)[::2, ::2]
+                reference = self._downsample(reference, 'ref')
+                distorted = self._downsample(distorted, 'dist')
+
+            buf = _vif_buffers(reference.shape)
+            L1, L2, mu1, mu2, sigma1_sq, sigma2_sq, sigma12, tmp = buf
+
+            self._lightness(reference, L1)
+            self._lightness(distorted, L2)
+
+            self.gaussian_filter(L1, sd, output=mu1, truncate=t)
+            self.gaussian_filter(L2, sd, output=mu2, truncate=t)
+
+            np.multiply(L1, L1, out=tmp)
+            self.gaussian_filter(tmp, sd, output=sigma1_sq, truncate=t)
+            sigma1_sq -= np.multiply(mu1, mu1, out=tmp)
+
+            np.multiply(L2, L2, out=tmp)
+            self.gaussian_filter(tmp, sd, output=sigma2_sq, truncate=t)
+            sigma2_sq -= np.multiply(mu2, mu2, out=tmp)
+
+            np.multiply(L1, L2, out=tmp)
+            self.gaussian_filter(tmp, sd, output=sigma12, truncate=t)
+            sigma12 -= np.multiply(mu1, mu2, out=tmp)
+
+            np.maximum(sigma1_sq, eps, out=sigma1_sq)
+            np.maximum(sigma2_sq, eps, out=sigma2_sq)
+            np.maximum(sigma12, eps, out=sigma12)
+
+            # g and sv_sq reuse the mean buffers, which are no longer needed
+            g, sv_sq = mu1, mu2
+
+            np.divide(sigma12, sigma1_sq, out=g)
+            np.multiply(g, sigma12, out=sv_sq)
+            np.subtract(sigma2_sq, sv_sq, out=sv_sq)
+
+            g[sigma1_sq < sigma_nsq] = 1
+            np.maximum(sv_sq, 0, out=sv_sq)
+
+            # log2(1 + g * g * sigma1_sq / (sv_sq + sigma_nsq))
+            sv_sq += sigma_nsq
+            np.multiply(g, g, out=tmp)
+            tmp *= sigma1_sq
+            tmp /= sv_sq
+            np.log2(np.add(tmp, 1, out=tmp), out=tmp)
+            num += float(tmp.sum(dtype=np.float64))
+
+            # log2(1 + sigma1_sq / sigma_nsq)
+            np.divide(sigma1_sq, sigma_nsq, out=tmp)
+            np.log2(np.add(tmp, 1, out=tmp), out=tmp)
+            den += float(tmp.sum(dtype=np.float64))
+
+        return num, den
+
+    def _downsample(self, plane: NDArray, name: str) -> NDArray:
+        blurred = scratch(f'vif_{name}', plane.shape)
+        self.gaussian_filter(plane, 1.08, output=blurred, truncate=1.5)
+
+        return blurred[::2, ::2]
+
+    @staticmethod
+    def _lightness(plane: NDArray, out: NDArray) -> None:
+        """
+        CIE L*, shifted down by 50 so the float32 variances below don't lose precision to a large mean.
+        Variances and covariances are unaffected by the shift.
+        """
+        np.cbrt(plane, out=out)
+        out *= 116
+        out -= 66
+
+        dark = plane <= 0.008856
+        np.multiply(plane, 903.3, out=out, where=dark)
+        np.subtract(out, 50, out=out, where=dark)
 
-            L1 = np.where(reference > 0.008856, np.power(reference, 1./3.) * 116 - 16, reference * 903.3)
-            L2 = np.where(distorted > 0.008856, np.power(distorted, 1./3.) * 116 - 16, distorted * 903.3)
 
-            mu1 = self.gaussian_filter(L1, sd, truncate=t)
-            mu2 = self.gaussian_filter(L2, sd, truncate=t)
+def _vif_buffers(shape: tuple[int, ...]) -> list[NDArray[np.float32]]:
+    return [scratch(f'vif_{i}', shape) for i in range(8)]
 
-            mu1_sq = mu1 * mu1
-            mu2_sq = mu2 * mu2
-            mu1_mu2 = mu1 * mu2
+def _relative(clip: str, dx: int, dy: int) -> str:
+    """akarin.Expr access to a neighbouring pixel, mirrored at the frame edges."""
+    return clip if dx == dy == 0 else f'{clip}[{dx},{dy}]:m'
 
-            sigma1_sq = self.gaussian_filter(L1 * L1, sd, truncate=t) - mu1_sq
-            sigma2_sq = self.gaussian_filter(L2 * L2, sd, truncate=t) - mu2_sq
 
-            sigma12 = self.gaussian_filter(L1 * L2, sd, truncate=t) - mu1_mu2
+def _box_expr(clip: str, size: int, vertical: bool) -> str:
+    """Mean of ``size`` pixels along one axis, like scipy's uniform_filter1d."""
+    radius = size // 2
+    taps = [_relative(clip, 0, k) if vertical else _relative(clip, k, 0) for k in range(-radius, radius + 1)]
 
-            sigma1_sq[sigma1_sq<eps] = eps
-            sigma2_sq[sigma2_sq<eps] = eps
+    return ' '.join(taps) + ' +' * (size - 1) + f' {size} /'
 
-            sigma12[sigma12<eps] = eps
 
-            g = sigma12 / sigma1_sq
-            sv_sq = sigma2_sq - g * sigma12
+def _sobel_expr(clip: str, vertical: bool) -> str:
+    """skimage's directional sobel: [1, 0, -1] across the axis, smoothed by [1, 2, 1] / 4 along the other."""
+    def pixel(along: int, across: int) -> str:
+        return _relative(clip, across, along) if vertical else _relative(clip, along, across)
 
-            g[sigma1_sq<sigma_nsq] = 1
-            sv_sq[sv_sq<0] = 0
+    before = f'{pixel(-1, -1)} {pixel(-1, 0)} 2 * + {pixel(-1, 1)} +'
+    after = f'{pixel(1, -1)} {pixel(1, 0)} 2 * + {pixel(1, 1)} +'
 
-            num += np.sum(np.log2(1 + g * g * sigma1_sq / (sv_sq + sigma_nsq)))
-            den += np.sum(np.log2(1 + sigma1_sq / sigma_nsq))
+    return f'{before} {after} - 4 /'
 
-        return num/den
 
 class Blur(BaseUtil):
     props: list[str] = ["blur"]
@@ -122,31 +180,78 @@ class Blur(BaseUtil):
         vs.RGBS
     )
     
-    def __init__(self):
-        self.detect_blur = blur_effect
+    def __init__(self, native: bool = True):
+        """
+        Blur effect of Crete et al., the metric behind skimage's ``blur_effect(image, h_size=11)``.
+
+        :param native:  Build the metric from akarin.Expr and PlaneStats, so it runs inside the graph.
+                        False calls skimage on every frame, which serves as the reference.
+                        Only the 11-tap box blur sees the frame edges, and the two treat them slightly differently.
+        """
+        self.native = native
+
+        if not native:
+            from skimage.measure import blur_effect
+
+            self.detect_blur = blur_effect
 
     def calculate(self, reference: vs.VideoNode, planes: list[int] | int = 0) -> vs.VideoNode | MetricVideoNode:
         validate_format(reference, self.formats)
 
-        if isinstance(planes, int):
-            planes = [planes]
+        self.planes = self._normalise_planes(planes)
+        self.props = self._generate_props(self.props, reference.format.color_family, self.planes)
 
-        self.props = self._generate_props(self.props, reference.format.color_family, planes)
+        if self.native:
+            clip = self._native(reference)
+        else:
+            clip = reference.std.ModifyFrame(reference, self._process_frame)
 
-        clip = reference.std.ModifyFrame(reference, self._process_frame)
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference])
 
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
-        fout = f.copy()
-        
-        f = [f[n] for n in range(len(self.props))]
+    def _native(self, reference: vs.VideoNode) -> vs.VideoNode:
+        """
+        For each axis: M1 sums |sobel(image)| and M2 sums max(0, |sobel(image)| - |sobel(box blurred image)|),
+        both over [2:-1] of the plane. The blur is the larger |M1 - M2| / M1 of the two axes.
+        Averages stand in for the sums, as both cover the same pixels.
+        """
+        num_planes = reference.format.num_planes
+        inside = 'X 2 >= X width 1 - < and Y 2 >= and Y height 1 - < and'
+
+        def exprs(expr: str) -> list[str]:
+            return [expr if plane in self.planes else '' for plane in range(num_planes)]
+
+        stats = [reference]
+
+        for vertical in (True, False):
+            box = _box_expr('x', 11, vertical)
+            sharp = f'{_sobel_expr("x", vertical)} abs'
+            blurred = f'{_sobel_expr("y", vertical)} abs'
+
+            filtered = reference.akarin.Expr(exprs(box))
+            edges = reference.akarin.Expr(exprs(f'{sharp} {inside} *'))
+            lost = core.akarin.Expr([reference, filtered], exprs(f'{sharp} {blurred} - 0 max {inside} *'))
+
+            for plane in self.planes:
+                edges = edges.std.PlaneStats(plane=plane, prop=f'BlurEdges{plane}')
+                lost = lost.std.PlaneStats(plane=plane, prop=f'BlurLost{plane}')
+
+            stats += [edges, lost]
+
+        # y, z: vertical edges/lost; a, b: horizontal edges/lost
+        def _blur(plane: int) -> str:
+            ratios = [
+                f'{edges}.BlurEdges{plane}Average {lost}.BlurLost{plane}Average - abs {edges}.BlurEdges{plane}Average /'
+                for edges, lost in (('y', 'z'), ('a', 'b'))
+            ]
+            return f'{ratios[0]} {ratios[1]} max'
 
-        for i, plane in enumerate(self.props):
-            arr = np.asarray(f[i])
-            difference = self.detect_blur(arr, h_size=11)
-            fout.props[plane] = float(difference)
+        return core.akarin.PropExpr(stats, lambda: {prop: _blur(plane) for prop, plane in zip(self.props, self.planes)})
 
-        return fout
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        return {
+            prop: float(self.detect_blur(arr, h_size=11))
+            for prop, arr in zip(self.props, arrays)
+        }
 
 
 class LocaLBinaryPattern(BaseUtil):
@@ -163,53 +268,77 @@ class LocaLBinaryPattern(BaseUtil):
         VAR = 'var'
 
     class LocaLBinaryPatternVideoNode(MetricVideoNode):
-        def __init__(self, clip: vs.VideoNode, lbp_map: vs.VideoNode, metric):
-            super().__init__(clip, metric)
-            self.lbp_map_node = lbp_map
+        def __init__(self, clip: vs.VideoNode, reference: vs.VideoNode, metric):
+            super().__init__(clip, metric, inputs=[reference])
+            self._reference = reference
+            self._lbp_map: vs.VideoNode | None = None
 
         def lbp_map(self) -> vs.VideoNode:
-            return self.lbp_map_node
-
-    def __init__(self, radius: int = 3, n_points = int, method: Methods = Methods.UNIFORM):
+            """
+            The LBP codes of every frame, scaled to 0-255. Built on first use,
+            so scoring alone never computes the map.
+            """
+            if self._lbp_map is None:
+                self._lbp_map = self._reference.std.ModifyFrame(self._reference, self._metric._map_frame)
+
+            return self._lbp_map
+
+    def __init__(self, radius: int = 3, n_points: int | None = None, method: Methods = Methods.UNIFORM):
+        """
+        :param radius:      Radius of the circle of neighbours.
+        :param n_points:    Number of neighbours on the circle. Defaults to ``8 * radius``.
+        :param method:      skimage LBP method.
+        """
         self.radius = radius
-        self.n_points = 8 * self.radius if n_points else n_points
+        self.n_points = 8 * self.radius if n_points is None else n_points
         self.method = method
         
+        from skimage.feature import local_binary_pattern
+
         self.lbp = local_binary_pattern
         self.hist = np.histogram
 
     def calculate(self, reference: vs.VideoNode) -> LocaLBinaryPatternVideoNode | vs.VideoNode:
         validate_format(reference, self.formats)
 
-        processed_clip = reference.std.ModifyFrame(reference, self._process_frame)
-        output_clip = reference.std.CopyFrameProps(prop_src=processed_clip, props=self.props)
+        self.planes = [0]
+
+        output_clip = reference.std.ModifyFrame(reference, self._process_frame)
 
-        return self.LocaLBinaryPatternVideoNode(output_clip, processed_clip, self)
+        return self.LocaLBinaryPatternVideoNode(output_clip, reference, self)
 
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        codes = self._codes(arrays[0])
+        return {self.props[0]: float(self._entropy(codes))}
+
+    def _map_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
         fout_props = f.copy()
 
-        arr = np.asarray(f[0])
-        score, lbp_map = self._process(arr)
-        fout_props.props[self.props[0]] = float(score)
-        np.copyto(np.asarray(fout_props[0]), lbp_map)
+        codes = self._codes(read_plane(f, 0))
+        fout_props.props[self.props[0]] = float(self._entropy(codes))
+
+        lbp_map = scratch('lbp_map', codes.shape, np.uint8)
+        np.copyto(lbp_map, codes / codes.max() * 255, casting='unsafe')
+        write_plane(fout_props, 0, lbp_map)
 
         return fout_props
 
-    def _process(self, frame) -> tuple[float, Any]:
-        lbp = self.lbp(frame, self.n_points, self.radius, self.method)
+    def _codes(self, frame: NDArray) -> NDArray:
+        return self.lbp(frame, self.n_points, self.radius, self.method)
 
-        n_bins = int(lbp.max() + 1)
-        hist, _ = self.hist(lbp.ravel(), bins=n_bins, range=(0, n_bins))
+    def _entropy(self, codes: NDArray) -> float:
+        if self.method == self.Methods.VAR:
+            # variance codes are not integers, so they still need real bins
+            n_bins = int(codes.max() + 1)
+            hist, _ = self.hist(codes.ravel(), bins=n_bins, range=(0, n_bins))
+        else:
+            # every other method yields small integer codes: one bin per code
+            hist = np.bincount(as_dtype(codes, np.intp, 'lbp_codes').ravel())
 
         hist = hist.astype("float")
         hist /= (hist.sum() + 1e-7)
 
-        score = -np.sum(hist * np.log2(hist + 1e-7))
-
-        lbp_map = (lbp / lbp.max() * 255).astype(np.uint8)
-
-        return score, lbp_map
+        return -np.sum(hist * np.log2(hist + 1e-7))
 
 # make parent class so props can be autocompleted
 #   class GLCMProps:
@@ -230,58 +359,135 @@ class GLCM(BaseUtil):
 
     formats: tuple[int, ...] = (
         vs.GRAYS,
+        vs.YUV420PS,
+        vs.YUV422PS,
+        vs.YUV444PS,
+        vs.RGBS
     )
 
-    def calculate(self, reference: vs.VideoNode, planes: int = 0) -> vs.VideoNode | MetricVideoNode:
-        validate_format(reference, self.formats)
+    def __init__(self, levels: int = 256, fast: bool = True):
+        """
+        Grey-level co-occurrence features of horizontally adjacent pixels (distance 1, angle 0).
 
-        if isinstance(planes, int):
-            planes = [planes]
+        :param levels:  Number of grey levels the 8-bit plane is quantised to, e.g. 32 or 64. At most 256.
+        :param fast:    Count pixel pairs with a single bincount and derive every feature from that matrix.
+                        False uses skimage's graycomatrix/graycoprops, which is slower but serves as the reference.
+        """
+        if not 2 <= levels <= 256:
+            raise ValueError("levels must be between 2 and 256")
 
-        self.output_props = self._generate_props(self.props, reference.format.color_family, planes)
+        self.levels = levels
+        self.fast = fast
+
+    def calculate(self, reference: vs.VideoNode, planes: list[int] | int = 0) -> vs.VideoNode | MetricVideoNode:
+        validate_format(reference, self.formats)
+
+        self.planes = self._normalise_planes(planes)
+        self.output_props = self._generate_props(self.props, reference.format.color_family, self.planes)
+        self._weights = self._glcm_weights(self.levels)
+        # float chroma is centred on 0 and has to be moved into 0-1 before it is quantised
+        self._chroma = [reference.format.color_family == vs.YUV and plane > 0 for plane in self.planes]
 
         clip = reference.std.ModifyFrame(reference, self._process_frame)
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference])
+
+    def get_props(self) -> list[str]:
+        return getattr(self, 'output_props', self.props)
+
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        stride = len(self.planes)
+        props = {}
+
+        # output_props is ordered feature-major: contrast_y, contrast_u, ..., correlation_v
+        for i, (arr, chroma) in enumerate(zip(arrays, self._chroma)):
+            for k, value in enumerate(self._process(arr, chroma)):
+                props[self.output_props[k * stride + i]] = float(value)
+
+        return props
+
+    def _quantise(self, frame: NDArray, chroma: bool = False) -> NDArray:
+        if chroma:
+            shifted = scratch('glcm_chroma', frame.shape, np.float32)
+            np.add(frame, 0.5, out=shifted)
+            frame = np.clip(shifted, 0, 1, out=shifted)
+
+        frame = to_uint8(frame, 'glcm')
+
+        if self.levels == 256:
+            return frame
+
+        wide = scratch('glcm_wide', frame.shape, np.uint16)
+        np.multiply(frame, self.levels, out=wide, dtype=np.uint16)
+        wide >>= 8
+
+        np.copyto(frame, wide, casting='unsafe')
+        return frame
 
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
-        fout = f.copy()
+    def _process(self, frame: NDArray, chroma: bool = False) -> tuple[float, float, float, float, float]:
+        frame = self._quantise(frame, chroma)
 
-        for i in range(f.format.num_planes):
-            arr = np.asarray(f[0])
-            features = self._process(arr)
-            for feature, value in features.items():
-                fout.props[feature] = float(value)
+        if not self.fast:
+            return self._skimage_glcm(frame)
 
-        return fout
+        levels = self.levels
 
-    def _process(self, frame) -> dict[str, any]:
-        frame = (frame * 255).astype(np.uint8)
+        # pack each (left, right) pair into one index so a single bincount builds the matrix
+        pairs = scratch('glcm_pairs', (frame.shape[0], frame.shape[1] - 1), np.intp)
+        np.multiply(frame[:, :-1], levels, out=pairs, dtype=np.intp)
+        pairs += frame[:, 1:]
+
+        counts = np.bincount(pairs.ravel(), minlength=levels * levels).reshape(levels, levels)
+        glcm = counts + counts.T
+        glcm = glcm / glcm.sum()
+
+        return self._glcm_features(glcm, self._weights)
+
+    @staticmethod
+    def _glcm_weights(levels: int) -> tuple[NDArray, NDArray, NDArray, NDArray]:
+        grey = np.arange(levels, dtype=np.float64)
+        difference = grey[:, None] - grey[None, :]
+
+        return difference ** 2, np.abs(difference), 1 / (1 + difference ** 2), grey
+
+    @staticmethod
+    def _glcm_features(glcm: NDArray, weights: tuple[NDArray, NDArray, NDArray, NDArray]) -> tuple[float, float, float, float, float]:
+        """
+        Same definitions as skimage's graycoprops for a normalised, symmetric matrix.
+        Symmetry makes both marginals equal, so one mean and variance serve rows and columns.
+        """
+        squared, absolute, inverse, grey = weights
+
+        contrast = np.vdot(glcm, squared)
+        dissimilarity = np.vdot(glcm, absolute)
+        homogeneity = np.vdot(glcm, inverse)
+        energy = np.sqrt(np.vdot(glcm, glcm))
+
+        centred = grey - glcm.sum(axis=1) @ grey
+        variance = glcm.sum(axis=1) @ centred ** 2
+
+        if np.sqrt(variance) < 1e-15:
+            correlation = 1.0
+        else:
+            correlation = centred @ glcm @ centred / variance
+
+        return contrast, dissimilarity, homogeneity, energy, correlation
+
+    def _skimage_glcm(self, frame: NDArray) -> tuple[float, float, float, float, float]:
+        from skimage.feature import graycomatrix, graycoprops
 
         glcm = graycomatrix(
             frame,
             distances=[1],
-            angles=[0, np.pi/4, np.pi/2, 3*np.pi/4],
-            levels=256,
+            angles=[0],
+            levels=self.levels,
             symmetric=True,
             normed=True
         )
 
-        contrast = graycoprops(glcm, 'contrast')[0, 0]
-        dissimilarity = graycoprops(glcm, 'dissimilarity')[0, 0]
-        homogeneity = graycoprops(glcm, 'homogeneity')[0, 0]
-        energy = graycoprops(glcm, 'energy')[0, 0]
-        correlation = graycoprops(glcm, 'correlation')[0, 0]
-        # TODO
-        # return list here
-        features = {
-            'texture_contrast': contrast,
-            'texture_dissimilarity': dissimilarity,
-            'texture_homogeneity': homogeneity,
-            'texture_energy': energy,
-            'texture_correlation': correlation
-        }
-
-        return features
+        return tuple(
+            graycoprops(glcm, prop)[0, 0]
+            for prop in ('contrast', 'dissimilarity', 'homogeneity', 'energy', 'correlation')
+        )
 
 class Sharpness(BaseUtil):
     props: list[str] = ["sharpness"]
@@ -289,31 +495,67 @@ class Sharpness(BaseUtil):
         vs.GRAYS,
     )
 
+    def __init__(self, native: bool = True):
+        """
+        Variance of the Laplacian of the plane scaled to 8 bits, as ``cv2.Laplacian(...).var()``.
+
+        :param native:  Build the metric from akarin.Expr and PlaneStats, so it runs inside the graph.
+                        False runs OpenCV on every frame, which serves as the reference.
+        """
+        self.native = native
+
     def calculate(self, reference: vs.VideoNode, planes: list[int] | int = 0) -> vs.VideoNode | MetricVideoNode:
-        validate_format(clip, self.formats)
+        validate_format(reference, self.formats)
 
-        if isinstance(planes, int):
-            planes = [planes]
+        self.planes = self._normalise_planes(planes)
+        self.output_props = self._generate_props(self.props, reference.format.color_family, self.planes)
 
-        self.output_props = self._generate_props(self.props, reference.format.color_family, planes)
+        if self.native:
+            clip = self._native(reference)
+        else:
+            clip = reference.std.ModifyFrame(reference, self._process_frame)
 
-        clip = reference.std.ModifyFrame(reference, self._process_frame)
-        return MetricVideoNode(reference, self)
+        return MetricVideoNode(clip, self, inputs=[reference])
+
+    def get_props(self) -> list[str]:
+        return getattr(self, 'output_props', self.props)
+
+    def _native(self, reference: vs.VideoNode) -> vs.VideoNode:
+        """
+        var(L) = E[L^2] - E[L]^2 of the 4-neighbour Laplacian L, reduced with PlaneStats.
+        The quantised Laplacian is integer valued, so its square is exact in float32.
+        """
+        num_planes = reference.format.num_planes
+
+        def pixel(dx: int, dy: int) -> str:
+            return f'{_relative("x", dx, dy)} 255 * floor'
 
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
-        fout = f.copy()
+        laplacian = f'{pixel(0, -1)} {pixel(-1, 0)} + {pixel(1, 0)} + {pixel(0, 1)} + {pixel(0, 0)} 4 * -'
 
-        for i in range(f.format.num_planes):
-            arr = np.asarray(f[i])
-            blur_score = self._laplacian(arr)
-            fout.props[self.output_props[i]] = float(blur_score)
+        lap = reference.akarin.Expr([laplacian if plane in self.planes else '' for plane in range(num_planes)])
+        squared = lap.akarin.Expr(['x dup *' if plane in self.planes else '' for plane in range(num_planes)])
 
-        return fout
+        for plane in self.planes:
+            lap = lap.std.PlaneStats(plane=plane, prop=f'SharpnessLap{plane}')
+            squared = squared.std.PlaneStats(plane=plane, prop=f'SharpnessSq{plane}')
+
+        return core.akarin.PropExpr([reference, lap, squared], lambda: {
+            prop: f'z.SharpnessSq{plane}Average y.SharpnessLap{plane}Average dup * -'
+            for prop, plane in zip(self.output_props, self.planes)
+        })
+
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        return {
+            prop: float(self._laplacian(arr))
+            for prop, arr in zip(self.output_props, arrays)
+        }
 
     def _laplacian(self, frame):
-        frame = (frame * 255).astype(np.uint8)
+        import cv2
 
-        laplacian = cv2.Laplacian(frame, cv2.CV_64F)
+        frame = to_uint8(frame, 'sharpness')
+
+        laplacian = cv2.Laplacian(frame, cv2.CV_64F, dst=scratch('sharpness_laplacian', frame.shape, np.float64))
 
         blur_score = laplacian.var()
 
@@ -321,34 +563,46 @@ class Sharpness(BaseUtil):
 
 class BRISQUE(BaseUtil):
     def __init__(self, model, range):
+        """
+        :param model:   Path to the BRISQUE model file.
+        :param range:   Path to the BRISQUE range file.
+        """
         self.model = model
         self.range = range
-        self.filter = cv2.quality.QualityBRISQUE_create(self.model, self.range)  # type: ignore
 
     props: list[str] = ["BRISQUE"]
     formats: tuple[int, ...] = (
         vs.GRAYS,
     )
 
+    @property
+    def model_key(self) -> tuple:
+        return ('brisque', os.path.abspath(self.model), os.path.abspath(self.range))
+
+    @property
+    def filter(self):
+        """The OpenCV BRISQUE filter, created once per model/range pair and process."""
+        return get_model(self.model_key, self._load_model)
+
+    def _load_model(self):
+        import cv2
+
+        return cv2.quality.QualityBRISQUE_create(os.fspath(self.model), os.fspath(self.range))  # type: ignore
+
     def calculate(self, reference: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
         validate_format(reference, self.formats)
 
+        self.planes = [0]
         self.output_props = self.props[0]
 
         clip = reference.std.ModifyFrame(reference, self._process_frame)
-        return MetricVideoNode(clip, self)
-
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
-        fout = f.copy()
+        return MetricVideoNode(clip, self, inputs=[reference])
 
-        arr = np.asarray(f[0])
-        sharpness_score = self._brisque(arr)
-        fout.props[self.output_props] = float(sharpness_score)
-
-        return fout
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        return {self.output_props: float(self._brisque(arrays[0]))}
 
     def _brisque(self, frame):
-        frame = (frame * 255).astype(np.uint8)
+        frame = to_uint8(frame, 'brisque')
 
         sharpness_score = self.filter.compute(frame)
 
@@ -370,49 +624,87 @@ class SVD(BaseUtil):
         vs.RGBS,
     )
 
+    def __init__(self, fast: bool = True, compression_ratio: float = 0.1, threshold: float = 0.1):
+        """
+        :param fast:                Compute singular values only, from the eigenvalues of the Gram matrix,
+                                    and the leading singular vectors with a partial SVD.
+                                    The rank-k compression error follows from the discarded singular values,
+                                    so no image is reconstructed. False runs the full decomposition.
+        :param compression_ratio:   Fraction of singular values kept for the compression error.
+        :param threshold:           Singular values above this count towards percentage_retained.
+        """
+        self.fast = fast
+        self.compression_ratio = compression_ratio
+        self.threshold = threshold
+
     def calculate(self, reference: vs.VideoNode, planes: list[int] | int = 0) -> vs.VideoNode | MetricVideoNode:
         validate_format(reference, self.formats)
 
-        if isinstance(planes, int):
-            planes = [planes]
+        self.planes = self._normalise_planes(planes)
+        self.output_props = self._generate_props(self.props, reference.format.color_family, self.planes)
 
-        self.props = self._generate_props(self.props, reference.format.color_family, planes)
-        print(self.props)
         clip = reference.std.ModifyFrame(reference, self._process_frame)
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference])
+
+    def get_props(self) -> list[str]:
+        return getattr(self, 'output_props', self.props)
 
-    def _process_frame(self, n: int, f: vs.VideoFrame) -> vs.VideoFrame:
-        fout = f.copy()
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        stride = len(self.planes)
+        props = {}
 
-        for _, k in enumerate([0, 1, 2]):
-            arr = np.asarray(f[k])
-            score = self._process(arr)
-            for i in range(len(score)):
-                fout.props[self.props[i]] = float(score[i])
+        for i, arr in enumerate(arrays):
+            for k, value in enumerate(self._process(arr)):
+                props[self.output_props[k * stride + i]] = float(value)
 
-        print(fout.props)
-        return fout
+        return props
+
+    def _decompose(self, frame: NDArray) -> tuple[NDArray, NDArray, NDArray]:
+        """
+        Returns the singular values and the leading left and right singular vectors.
+        """
+        if not self.fast:
+            U, S, VT = np.linalg.svd(frame, full_matrices=False)
+            return S, U[:, 0], VT[0, :]
+
+        from scipy.sparse.linalg import svds
+
+        # singular values are the square roots of the eigenvalues of the smaller Gram matrix,
+        # which is far cheaper than bidiagonalising the frame; float64 keeps the small ones accurate
+        wide = as_dtype(frame, np.float64, 'svd')
+        gram = wide @ wide.T if frame.shape[0] <= frame.shape[1] else wide.T @ wide
+        S = np.sqrt(np.clip(np.linalg.eigvalsh(gram)[::-1], 0, None))
+
+        # a fixed start vector keeps the result reproducible between runs
+        u, _, vt = svds(frame, k=1, v0=np.ones(min(frame.shape), dtype=frame.dtype))
+        return S, u[:, 0], vt[0, :]
+
+    @staticmethod
+    def _entropy(values: NDArray) -> float:
+        # zeros contribute nothing (0 log 0 = 0); rank-deficient frames, e.g. letterboxed ones,
+        # have exact zero singular values in fast mode and would otherwise turn the sum into NaN
+        values = values[values > 0]
+        return -np.sum(values * np.log2(values))
 
     def _process(self, frame) -> list:
-        U, S, VT = np.linalg.svd(frame)
+        S, u, v = self._decompose(frame)
 
-        compression_ratio = 0.1
-        k = int(compression_ratio * len(S))
-        compressed_image = U[:, :k] @ np.diag(S[:k]) @ VT[:k, :]
-        compression_error = np.sum((frame - compressed_image) ** 2)
+        # Eckart-Young: the squared error of the best rank-k approximation
+        # is the energy of the discarded singular values
+        k = int(self.compression_ratio * len(S))
+        compression_error = np.sum(S[k:].astype(np.float64) ** 2)
 
-        texture_entropy = -np.sum(S * np.log2(S))
+        texture_entropy = self._entropy(S)
         texture_energy = np.sum(S ** 2)
         
         singular_value_spectrum = np.mean(S / np.sum(S))
 
         singular_value_ratio = S[0] / np.sum(S)
 
-        left_singular_vector_entropy = -np.sum(U[:, 0]**2 * np.log2(U[:, 0]**2))
-        right_singular_vector_entropy = -np.sum(VT[0, :]**2 * np.log2(VT[0, :]**2))
+        left_singular_vector_entropy = self._entropy(u**2)
+        right_singular_vector_entropy = self._entropy(v**2)
 
-        threshold = 0.1
-        num_retained_values = np.sum(S > threshold)
+        num_retained_values = np.sum(S > self.threshold)
         percentage_retained = num_retained_values / len(S)
 
         return [
@@ -424,4 +716,4 @@ class SVD(BaseUtil):
             left_singular_vector_entropy,
             right_singular_vector_entropy,
             percentage_retained
-        ]
\ No newline at end of file
+        ]
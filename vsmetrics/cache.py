@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from numpy.typing import NDArray
+from vstools import vs, clip_async_render
+from .meta import metric_params
+
+
+class ScoreCache:
+    """
+    On-disk cache of per-frame scores, addressed by clip identity, metric class and metric parameters.
+
+    Entries are stored as one ``.npz`` file per key. When the cache grows past ``max_bytes``
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None, max_bytes: int = 1 << 30, samples: int = 8):
+        """
+        :param path:        Cache directory. Defaults to ``./.vsmetrics/cache``.
+        :param max_bytes:   Size bound of the cache directory.
+        :param samples:     Number of evenly spaced frames hashed to fingerprint a clip.
+        """
+        self.path = os.path.abspath(path or os.path.join(os.getcwd(), '.vsmetrics', 'cache'))
+        self.max_bytes = max_bytes
+        self.samples = samples
+        self._lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(
+        self,
+        clip: vs.VideoNode,
+        metric,
+        props: list[str],
+        source: str | os.PathLike | None = None,
+        inputs: list[vs.VideoNode] | None = None
+    ) -> str:
+        """
+        Builds the cache key of a metric's output clip from the metric's settings and ``clip_identity``.
+        """
+        identity = dict(
+            metric=self._metric_name(metric),
+            params=metric_params(metric),
+            props=props,
+            **clip_identity(clip, inputs, source, self.samples)
+        )
+
+        digest = hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+        return f"{identity['metric']}-{digest}"
+
+    def get(self, key: str) -> dict[str, NDArray] | None:
+        """
+        Returns the cached columns of ``key``, or None on a miss.
+        """
+        file_path = self._file(key)
+
+        try:
+            with np.load(file_path) as data:
+                columns = {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        # the modification time doubles as the LRU timestamp
+        os.utime(file_path)
+
+        return columns
+
+    def put(self, key: str, columns: dict[str, NDArray]) -> None:
+        file_path = self._file(key)
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **columns)
+
+        os.replace(temp_path, file_path)
+
+        self._evict()
+
+    def invalidate(self, metric=None, key: str | None = None) -> int:
+        """
+        Removes cached entries.
+
+        :param metric:  A metric class, instance or name. Removes all of its entries.
+        :param key:     A single key returned by ``key()``.
+                        With neither argument, the whole cache is cleared.
+
+        :return:        The number of entries removed.
+        """
+        if key is not None:
+            names = [os.path.basename(self._file(key))]
+        elif metric is not None:
+            prefix = f"{self._metric_name(metric)}-"
+            names = [name for name in self._entries() if name.startswith(prefix)]
+        else:
+            names = self._entries()
+
+        removed = 0
+
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        return removed
+
+    def clear(self) -> int:
+        return self.invalidate()
+
+    def size(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in self._entries())
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+
+            for name in self._entries():
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue
+
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+                total -= size
+
+    def _entries(self) -> list[str]:
+        return [name for name in os.listdir(self.path) if name.endswith('.npz')]
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.npz")
+
+    @staticmethod
+    def _metric_name(metric) -> str:
+        if isinstance(metric, str):
+            return metric
+        if isinstance(metric, type):
+            return metric.__name__
+        return metric.__class__.__name__
+
+
+def clip_identity(
+    clip: vs.VideoNode,
+    inputs: list[vs.VideoNode] | None = None,
+    source: str | os.PathLike | None = None,
+    samples: int = 8
+) -> dict:
+    """
+    Describes a metric's output clip for cache keys and checkpoints.
+
+    ``samples`` evenly spaced frames of every input clip are rendered and their pixels hashed, which ties
+    the identity to the frame range and to both the reference and the distorted clip without computing
+    the metric. Without ``inputs`` the pixels of the output clip are hashed instead, which does compute it.
+    With ``source`` the file's path, size and modification time are added on top.
+    """
+    identity = dict(
+        num_frames=clip.num_frames,
+        width=clip.width,
+        height=clip.height,
+        format=clip.format.name,  # type: ignore
+        fps=str(clip.fps),
+    )
+
+    if source is not None:
+        stat = os.stat(source)
+        identity['source'] = [os.path.abspath(source), stat.st_size, stat.st_mtime_ns]
+
+    identity['fingerprint'] = [_fingerprint(node, samples) for node in (inputs or [clip])]
+
+    return identity
+
+
+def _fingerprint(clip: vs.VideoNode, samples: int) -> str:
+    digest = hashlib.sha256()
+    count = min(samples, clip.num_frames)
+    frames = sorted({int(i) for i in np.linspace(0, clip.num_frames - 1, count)})
+
+    def _hash(n: int, f: vs.VideoFrame) -> bytes:
+        sample = hashlib.sha256()
+
+        for plane in range(f.format.num_planes):
+            # every 16th row is plenty to tell clips apart and keeps 4K frames cheap
+            sample.update(np.ascontiguousarray(np.asarray(f[plane])[::16]).tobytes())
+
+        return sample.digest()
+
+    sampled = clip_async_render(
+        clip=clip[frames[0]] if len(frames) == 1 else clip.std.Splice([clip[i] for i in frames]),
+        outfile=None,
+        progress=None,
+        callback=_hash
+    )
+
+    for value in sampled:  # type: ignore
+        digest.update(value)
+
+    return digest.hexdigest()
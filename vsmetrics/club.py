@@ -21,35 +21,39 @@ class GMSD:
         self.c = c
 
     class GMSDVideoNode(MetricVideoNode):
-        def __init__(self, clips: tuple[vs.VideoNode, ...], metric):
-            super().__init__(clips[0], metric)
-            self._gradient_map = clips[1]
+        def __init__(self, clip: vs.VideoNode, metric, reference: vs.VideoNode, distorted: vs.VideoNode):
+            super().__init__(clip, metric, inputs=[reference, distorted])
+            self._inputs = (reference, distorted)
+            self._gradient_map: vs.VideoNode | None = None
 
         def gradient_map(self) -> vs.VideoNode:
+            """The gradient magnitude similarity map. Built on first use, so scoring alone never renders it."""
+            if self._gradient_map is None:
+                self._gradient_map = self._metric._gmsd(*self._inputs, show_map=True)
+
             return self._gradient_map
 
     def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> GMSDVideoNode:
-        from muvsfunc import GMSD as _GMSD
-
         validate_format(reference, self.formats)
         validate_format(distorted, self.formats)
 
-        measure = _GMSD(
+        measure = self._gmsd(reference, distorted, show_map=False)
+        clip = core.std.CopyFrameProps(distorted, measure, self.props)
+
+        return self.GMSDVideoNode(clip, self, reference, distorted)
+
+    def _gmsd(self, reference: vs.VideoNode, distorted: vs.VideoNode, show_map: bool) -> vs.VideoNode:
+        from muvsfunc import GMSD as _GMSD
+
+        return _GMSD(
             reference,
             distorted,
             self.plane,
             self.downsample,
             self.c,
-            True  # type: ignore
+            show_map  # type: ignore
         )  # type: ignore
 
-        measure = (
-            core.std.CopyFrameProps(distorted, measure, self.props),
-            measure
-        )
-
-        return self.GMSDVideoNode(measure, self)
-
 
 class SSIM:
     props: list[str] = ["PlaneSSIM"]
@@ -73,11 +77,16 @@ class SSIM:
         self.k2 = k2
 
     class SSIMVideoNode(MetricVideoNode):
-        def __init__(self, clips: tuple[vs.VideoNode, ...], metric):
-            super().__init__(clips[0], metric)
-            self._map = clips[1]
+        def __init__(self, clip: vs.VideoNode, metric, reference: vs.VideoNode, distorted: vs.VideoNode):
+            super().__init__(clip, metric, inputs=[reference, distorted])
+            self._inputs = (reference, distorted)
+            self._map: vs.VideoNode | None = None
 
         def map(self) -> vs.VideoNode:
+            """The SSIM map. Built on first use, so scoring alone never renders it."""
+            if self._map is None:
+                self._map = self._metric._ssim(*self._inputs, show_map=True)
+
             return self._map
 
     def calculate(
@@ -85,12 +94,23 @@ class SSIM:
         reference: vs.VideoNode,
         distorted: vs.VideoNode
     ) -> SSIMVideoNode | vs.VideoNode:
-        from muvsfunc import SSIM as _SSIM
-
         validate_format(reference, self.formats)
         validate_format(distorted, self.formats)
 
-        measure = _SSIM(
+        measure = self._ssim(reference, distorted, show_map=False)
+
+        clip = core.std.CopyFrameProps(
+            distorted,
+            measure,
+            self.props
+        )
+
+        return self.SSIMVideoNode(clip, self, reference, distorted)
+
+    def _ssim(self, reference: vs.VideoNode, distorted: vs.VideoNode, show_map: bool) -> vs.VideoNode:
+        from muvsfunc import SSIM as _SSIM
+
+        return _SSIM(
             reference,
             distorted,
             None,
@@ -98,19 +118,9 @@ class SSIM:
             self.k1,
             self.k2,
             self.dynamic_range,  # type: ignore
-            show_map=True
+            show_map=show_map
         )  # type: ignore
 
-        measure = (
-            core.std.CopyFrameProps(
-                distorted,
-                measure,
-                self.props
-            ), measure
-        )
-
-        return self.SSIMVideoNode(measure, self)
-
 class MDSI:
     props: list[str] = ["FrameMDSI"]
     formats: tuple[int, ...] = (
@@ -123,37 +133,46 @@ class MDSI:
         self.alpha = alpha
 
     class MDSIVideoNode(MetricVideoNode):
-        def __init__(self, clips: tuple[vs.VideoNode, ...], metric):
-            super().__init__(clips[0], metric)
-            self._gs_map = clips[1]
-            self._cs_map = clips[2]
-            self._gcs_map = clips[3]
+        def __init__(self, clip: vs.VideoNode, metric, reference: vs.VideoNode, distorted: vs.VideoNode):
+            super().__init__(clip, metric, inputs=[reference, distorted])
+            self._inputs = (reference, distorted)
+            self._maps: list[vs.VideoNode] | None = None
+
+        def _map(self, index: int) -> vs.VideoNode:
+            # the three maps come from one graph, built the first time any of them is asked for
+            if self._maps is None:
+                self._maps = self._metric._mdsi(*self._inputs, show_maps=True)
+
+            return self._maps[index].std.RemoveFrameProps("_Matrix")
 
         def gradient_map(self) -> vs.VideoNode:
-            return self._gs_map.std.RemoveFrameProps("_Matrix")
+            return self._map(1)
 
         def chromaticity_map(self) -> vs.VideoNode:
-            return self._cs_map.std.RemoveFrameProps("_Matrix")
+            return self._map(2)
 
         def gradient_chromaticity_map(self) -> vs.VideoNode:
-            return self._gcs_map.std.RemoveFrameProps("_Matrix")
+            return self._map(3)
 
     def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> MDSIVideoNode | vs.VideoNode:
-        from muvsfunc import MDSI as _MDSI
-
         validate_format(reference, self.formats)
         validate_format(distorted, self.formats)
 
-        measure = _MDSI(
+        measure = self._mdsi(reference, distorted, show_maps=False)
+
+        return self.MDSIVideoNode(measure, self, reference, distorted) # type: ignore
+
+    def _mdsi(self, reference: vs.VideoNode, distorted: vs.VideoNode, show_maps: bool):
+        from muvsfunc import MDSI as _MDSI
+
+        return _MDSI(
             reference,
             distorted,
             1.0,  # type: ignore
             self.alpha,
-            show_maps=True
+            show_maps=show_maps
         )
 
-        return self.MDSIVideoNode(measure, self) # type: ignore
-
 @name
 class PSNR:
     def __init__(
@@ -312,7 +331,7 @@ class PSNR:
                 )
             )
 
-        return MetricVideoNode(metric, self)
+        return MetricVideoNode(metric, self, inputs=[reference, distorted])
 
     def __call__(self, reference: vs.VideoNode, distorted: vs.VideoNode, planes: None | int | list[int] = None) -> vs.VideoNode:
         return self.calculate(reference, distorted, planes)
@@ -342,10 +361,6 @@ class WADIQAM:
         model_path: None | PathLike = None
     ) -> None:
 
-        from vs_wadiqam_chainer import wadiqam_fr, wadiqam_nr
-        self._wadiqam_fr = wadiqam_fr
-        self._wadiqam_nr = wadiqam_nr
-
         self.DATASET = dataset.value
         self.EVALUATION_METHOD = method.value
         self.model_path = model_path
@@ -381,12 +396,14 @@ class WADIQAM:
         if distorted:
             validate_format(distorted, self.formats)
 
+        from vs_wadiqam_chainer import wadiqam_fr, wadiqam_nr
+
         prepared_reference, prepared_distorted = self._prepare(
             reference, distorted
             )
 
         if prepared_distorted is not None:
-            measure = self._wadiqam_fr(
+            measure = wadiqam_fr(
                 clip1=prepared_reference,
                 clip2=prepared_distorted,
                 model_folder_path=self.model_path,
@@ -395,7 +412,7 @@ class WADIQAM:
                 max_batch_size=self.MAX_BATCH_SIZE
             )
         else:
-            measure = self._wadiqam_nr(
+            measure = wadiqam_nr(
                 clip=prepared_reference,
                 model_folder_path=self.model_path,
                 dataset=self.DATASET,
@@ -3,9 +3,10 @@
 
 import os
 from warnings import warn
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from vstools import merge_clip_props, vs, core, clip_async_render, clip_data_gather, SceneChangeMode, SceneBasedDynamicCache
+from .meta import collect_props
+from vstools import merge_clip_props, vs, core, clip_data_gather, SceneChangeMode, SceneBasedDynamicCache
 
 
 class CSVHandler:
@@ -19,28 +20,53 @@ class CSVHandler:
         self,
         clip: vs.VideoNode,
         overwrite: bool = False,
-        scenechange: bool = True
+        scenechange: bool = True,
+        async_requests: int | None = None,
+        props: list[str] | None = None
     ):
+        """
+        Renders the clip and writes the requested frame props to CSV.
+
+        :param props:   Props to write. Defaults to the numeric props of the first frame
+                        that are not reserved (underscore-prefixed) props.
+        """
 
         file_path = os.path.abspath(self.filepath)
 
         if os.path.exists(file_path) and not overwrite:
             print("Using existing data!!")
             return
-        
+
+        data = self._gather(clip, scenechange, async_requests, props)
+        data.to_csv(self.filepath, index=False)
+
+    def _gather(
+        self,
+        clip: vs.VideoNode,
+        scenechange: bool,
+        async_requests: int | None,
+        props: list[str] | None,
+        dtype=np.float64
+    ) -> pd.DataFrame:
         if scenechange:
             clip = clip.resize.Bilinear(640, 360)
             clip = clip.wwxd.WWXD()
-            
-        data = clip_async_render(
-            clip, outfile=None, progress='Getting frame props...',
-            callback=lambda _, f: f.props.copy(), async_requests=2 # noqa
-            )
 
-        data = pd.DataFrame(data)
-        data.to_csv(self.filepath, index=False)
+        if props is None:
+            props = [
+                key for key, value in clip.get_frame(0).props.items()
+                if not key.startswith('_') and isinstance(value, (int, float))
+            ]
+        elif scenechange and 'Scenechange' not in props:
+            props = [*props, 'Scenechange']
+
+        data = collect_props(clip, props, dtype, async_requests=async_requests)
+
+        return pd.DataFrame(data, copy=False)
     
     def plot_data(self, column):
+        import matplotlib.pyplot as plt
+
         df = self.read_csv()
         df[column].plot()
         plt.show()
@@ -49,3 +75,35 @@ class CSVHandler:
         # rename props to consistent style
         ...
 
+
+class ParquetHandler(CSVHandler):
+    """
+    Same as CSVHandler, but stores float32 columns in a compressed Parquet file. Requires pyarrow.
+    """
+
+    def read_parquet(self, columns: list[str] | None = None) -> pd.DataFrame:
+        return pd.read_parquet(self.filepath, columns=columns, memory_map=True)
+
+    def read_csv(self):
+        return self.read_parquet()
+
+    def write_parquet(
+        self,
+        clip: vs.VideoNode,
+        overwrite: bool = False,
+        scenechange: bool = True,
+        async_requests: int | None = None,
+        props: list[str] | None = None,
+        compression: str = 'zstd'
+    ):
+        file_path = os.path.abspath(self.filepath)
+
+        if os.path.exists(file_path) and not overwrite:
+            print("Using existing data!!")
+            return
+
+        data = self._gather(clip, scenechange, async_requests, props, np.float32)
+        data.to_parquet(file_path, index=False, compression=compression)
+
+    write_csv = write_parquet
+
@@ -1,15 +1,16 @@
-# find offset
-# find desync point
-
 from os import PathLike
 from typing import Any
-from vsexprtools import ExprOp, combine
+from warnings import warn
+import numpy as np
+from numpy.typing import NDArray
 from vskernels import Catrom
-from vstools import DitherType, Matrix, MatrixT, Transfer, TransferT, merge_clip_props, vs, core, depth
+from vstools import DitherType, Matrix, MatrixT, Transfer, TransferT, clip_async_render, get_y, vs, core, depth
 
 from .good import SSIMULACRA, BUTTERAUGLI
-from .club import PSNR, MDSI, GMSD, SSIM_Alt, WADIQAM
+from .club import PSNR, MDSI, GMSD, WADIQAM
+from .vmaf import CAMBI
 from .util import ReductionMode, pre_process
+from .meta import MultiMetricVideoNode, resolve_async_requests
 
 
 def compare(
@@ -19,47 +20,366 @@ def compare(
     preprocess = ReductionMode.Hybrid(chunks=4),
     matrix: MatrixT = Matrix.BT709,
     transfer: TransferT = Transfer.BT709,
-) -> vs.VideoNode:
-    
+    align: bool = False,
+    frame_map: NDArray[np.int64] | None = None,
+) -> MultiMetricVideoNode:
+    """
+    Scores one or more metrics from a single render of the reference/distorted pair.
+
+    Every metric branches off the same (preprocessed) nodes, so each source frame
+    is decoded once and the scores of all metrics are collected in one pass.
+
+    :param reference:   The reference clip.
+    :param distorted:   The distorted clip.
+    :param metric:      A metric, or a list of metrics, to calculate.
+    :param preprocess:  Optional ReductionMode applied to both clips before scoring.
+    :param align:       Detect the frame offset between the clips with ``find_offset`` first
+                        and trim them so the scored frames are paired correctly.
+    :param frame_map:   Reference frame of every distorted frame, as returned by ``find_desync``.
+                        Re-pairs the clips before scoring. Takes precedence over ``align``.
+
+    :return:            A MultiMetricVideoNode carrying the props of every metric.
+    """
+
     if isinstance(metric, list) is False:
         metric = [metric]
-    
+
+    if frame_map is not None:
+        reference = apply_frame_map(reference, frame_map)
+        distorted = distorted[:len(frame_map)]
+    elif align:
+        offset, confidence = find_offset(reference, distorted)
+
+        if confidence < 0.5:
+            warn(f"Low confidence ({confidence:.2f}) in the detected offset of {offset} frames, scoring the clips unaligned.")
+        else:
+            reference, distorted = apply_offset(reference, distorted, offset)
+
     if preprocess:
         reference, distorted = pre_process(reference, distorted, preprocess)  # type: ignore
-    
-    raise NotImplementedError
 
+    nodes = [m.calculate(reference, distorted) for m in metric]
 
-def banding_mask(
+    return MultiMetricVideoNode(distorted, metric, nodes)
+
+
+def frame_signatures(
     clip: vs.VideoNode,
+    size: tuple[int, int] = (16, 9),
+    async_requests: int | None = None
+) -> NDArray[np.float32]:
+    """
+    Returns a tiny luma thumbnail of every frame, flattened to a (num_frames, width * height) array.
+
+    :param clip:            The clip to sample. RGB clips use the green plane as luma.
+    :param size:            Thumbnail width and height.
+    :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+
+    :return:                The per-frame thumbnails.
+    """
+    if clip.format.color_family == vs.RGB:  # type: ignore
+        luma = clip.std.ShufflePlanes(1, vs.GRAY)
+    else:
+        luma = get_y(clip)
+
+    luma = luma.resize.Bilinear(size[0], size[1], format=vs.GRAYS)
+    signatures = np.empty((clip.num_frames, size[0] * size[1]), dtype=np.float32)
+
+    def _store(n: int, f: vs.VideoFrame) -> None:
+        signatures[n] = np.asarray(f[0]).ravel()
+
+    clip_async_render(luma, None, None, _store, async_requests=resolve_async_requests(async_requests))
+
+    return signatures
+
+
+def find_offset(
+    reference: vs.VideoNode,
+    distorted: vs.VideoNode,
+    window: int = 2000,
+    max_offset: int = 250,
+    start: int = 0,
+    async_requests: int | None = None
+) -> tuple[int, float]:
+    """
+    Finds the frame offset between two clips, such that ``distorted[n]`` matches ``reference[n + offset]``.
+
+    Only ``window`` frames of the distorted clip, and the matching span of the reference padded by
+    ``max_offset``, are rendered as tiny thumbnails. Their frame-to-frame differences are
+    cross-correlated with an FFT.
+
+    :param reference:       The reference clip.
+    :param distorted:       The distorted clip.
+    :param window:          Number of distorted frames to sample.
+    :param max_offset:      Largest offset, in either direction, that is searched.
+    :param start:           First distorted frame of the sampled window.
+    :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+
+    :return:                The offset and a confidence between 0 and 1, the correlation
+                            of the aligned frame differences.
+    """
+    dist_end = min(start + window, distorted.num_frames)
+    ref_start = max(0, start - max_offset)
+    ref_end = min(dist_end + max_offset, reference.num_frames)
+
+    if dist_end - start < 3 or ref_end - ref_start < 3:
+        raise ValueError("Not enough frames to find an offset.")
+
+    ref_signatures = frame_signatures(reference[ref_start:ref_end], async_requests=async_requests)
+    dist_signatures = frame_signatures(distorted[start:dist_end], async_requests=async_requests)
+
+    return _correlate_offset(ref_signatures, dist_signatures, start - ref_start, max_offset)
+
+
+def apply_offset(reference: vs.VideoNode, distorted: vs.VideoNode, offset: int) -> tuple[vs.VideoNode, vs.VideoNode]:
+    """
+    Trims both clips so ``distorted[n]`` is paired with ``reference[n + offset]`` and both have the same length.
+    """
+    if offset > 0:
+        reference = reference[offset:]
+    elif offset < 0:
+        distorted = distorted[-offset:]
+
+    length = min(reference.num_frames, distorted.num_frames)
+
+    return reference[:length], distorted[:length]
+
+
+def find_desync(
+    reference: vs.VideoNode,
+    distorted: vs.VideoNode,
+    max_drift: int = 48,
+    max_skip: int = 4,
+    penalty: float = 0.5,
+    chunk: int = 2000,
+    async_requests: int | None = None
+) -> tuple[NDArray[np.int64], list[int]]:
+    """
+    Walks both clips and finds where frames were dropped or duplicated.
+
+    The clips are rendered ``chunk`` frames at a time as tiny thumbnails and aligned with a banded,
+    monotonic dynamic time warp. Every distorted frame is paired with exactly one reference frame.
+    It can follow on from the previous pairing (+1), repeat it (a duplicated frame), or skip up to
+    ``max_skip`` reference frames (dropped frames). Only the band of ``2 * max_drift + 1`` offsets
+    is tracked, but the backtracking keeps that many bytes per distorted frame, so memory is not
+    bounded: about 100 MB per million frames at the default ``max_drift``.
+
+    :param reference:       The reference clip.
+    :param distorted:       The distorted clip.
+    :param max_drift:       Largest offset, in either direction, the clips may drift apart.
+    :param max_skip:        Most reference frames that may be dropped at once.
+    :param penalty:         Cost of every dropped or duplicated frame, relative to the thumbnail
+                            distance of two unrelated frames (about 1.1).
+    :param chunk:           Number of distorted frames rendered at a time.
+    :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+
+    :return:                The frame map, holding the reference frame of every distorted frame,
+                            and the distorted frames where the pairing changes.
+    """
+    aligner = _BandAligner(max_drift, max_skip, penalty)
+
+    for start in range(0, distorted.num_frames, chunk):
+        end = min(start + chunk, distorted.num_frames)
+        ref_start = min(max(0, start - max_drift), reference.num_frames)
+        ref_end = min(end + max_drift, reference.num_frames)
+
+        dist = _standardise(frame_signatures(distorted[start:end], async_requests=async_requests))
+        ref = _standardise(frame_signatures(reference[ref_start:ref_end], async_requests=async_requests)) \
+            if ref_end > ref_start else np.empty((0, dist.shape[1]), dtype=np.float32)
+
+        aligner.feed(_band_costs(ref, dist, start - ref_start, aligner.lags))
+
+    frame_map, steps = aligner.path()
+
+    return np.clip(frame_map, 0, reference.num_frames - 1), np.flatnonzero(steps).tolist()
+
+
+def apply_frame_map(reference: vs.VideoNode, frame_map: NDArray[np.int64]) -> vs.VideoNode:
+    """
+    Reorders the reference so frame ``n`` is ``reference[frame_map[n]]``.
+
+    The clip is spliced from runs of consecutive frames, so the graph only grows with the number of desyncs.
+    """
+    frame_map = np.asarray(frame_map, dtype=np.int64)
+
+    if not frame_map.size:
+        raise ValueError("frame_map is empty.")
+
+    breaks = np.flatnonzero(np.diff(frame_map) != 1) + 1
+    runs = np.split(frame_map, breaks)
+
+    clips = [reference[int(run[0]):int(run[-1]) + 1] for run in runs]
+
+    return clips[0] if len(clips) == 1 else core.std.Splice(clips)
+
+
+class _BandAligner:
+    """
+    Monotonic DTW over a fixed band of offsets (reference frame minus distorted frame).
+
+    Every row advances the distorted clip by one frame, so each step is a vectorised update of the band.
+    The backpointers of every row are kept until ``path()``, one byte per band offset and frame.
+    """
+
+    # cost of a distorted frame whose paired reference frame falls outside the clip
+    MISSING = 4.0
+
+    def __init__(self, max_drift: int, max_skip: int, penalty: float):
+        self.lags = np.arange(-max_drift, max_drift + 1)
+        self.max_skip = max_skip
+        self.penalty = penalty
+        self._total: NDArray[np.float64] | None = None
+        self._steps: list[NDArray[np.int8]] = []
+
+    def feed(self, costs: NDArray[np.float64]) -> None:
+        """
+        Advances the alignment by one row of band costs per distorted frame.
+        """
+        width = len(self.lags)
+
+        for cost in costs:
+            if self._total is None:
+                self._total = cost.copy()
+                self._steps.append(np.zeros(width, dtype=np.int8))
+                continue
+
+            previous = self._total
+            total = previous.copy()
+            step = np.zeros(width, dtype=np.int8)
+
+            # duplicated frame: same reference frame again, so the offset shrinks by one
+            candidate = np.full(width, np.inf)
+            candidate[:-1] = previous[1:] + self.penalty
+            better = candidate < total
+            total[better] = candidate[better]
+            step[better] = -1
+
+            # dropped frames: the reference skips ahead, so the offset grows
+            for skip in range(1, min(self.max_skip, width - 1) + 1):
+                candidate = np.full(width, np.inf)
+                candidate[skip:] = previous[:-skip] + self.penalty * skip
+                better = candidate < total
+                total[better] = candidate[better]
+                step[better] = skip
+
+            self._total = total + cost
+            self._steps.append(step)
+
+    def path(self) -> tuple[NDArray[np.int64], NDArray[np.int8]]:
+        """
+        Backtracks the cheapest alignment. Returns the frame map and the step taken into every frame.
+        """
+        if self._total is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+
+        steps = np.stack(self._steps)
+        lag = int(np.argmin(self._total))
+        frame_map = np.empty(len(steps), dtype=np.int64)
+        taken = np.zeros(len(steps), dtype=np.int8)
+
+        for n in range(len(steps) - 1, -1, -1):
+            frame_map[n] = n + self.lags[lag]
+            taken[n] = steps[n, lag] if n else 0
+            lag += 1 if taken[n] == -1 else -int(taken[n])
+
+        return frame_map, taken
+
+
+def _standardise(signatures: NDArray[np.float32]) -> NDArray[np.float32]:
+    # per-frame zero mean and unit variance, so fades and grading shifts don't read as a different frame
+    signatures = signatures - signatures.mean(axis=1, keepdims=True)
+    signatures /= signatures.std(axis=1, keepdims=True) + 1e-6
+
+    return signatures
+
+
+def _band_costs(ref: NDArray[np.float32], dist: NDArray[np.float32], dist_position: int, lags: NDArray) -> NDArray[np.float64]:
+    # dist_position is where the first distorted frame sits within the reference block at offset 0
+    costs = np.full((len(dist), len(lags)), _BandAligner.MISSING)
+    rows = np.arange(len(dist))
+
+    for column, lag in enumerate(lags):
+        index = rows + dist_position + lag
+        valid = (index >= 0) & (index < len(ref))
+
+        if valid.any():
+            costs[valid, column] = np.abs(ref[index[valid]] - dist[valid]).mean(axis=1)
+
+    return costs
+
+
+def _normalise_motion(signatures: NDArray[np.float32]) -> NDArray[np.float64]:
+    # frame-to-frame differences are unaffected by brightness or grading shifts between the clips
+    motion = np.diff(signatures.astype(np.float64), axis=0)
+    motion -= motion.mean(axis=0)
+    motion /= motion.std() + 1e-12
+
+    return motion
+
+
+def _correlate_offset(
+    ref_signatures: NDArray[np.float32],
+    dist_signatures: NDArray[np.float32],
+    dist_position: int,
+    max_offset: int
+) -> tuple[int, float]:
+    # dist_position is where the first distorted signature sits in the reference block at offset 0
+    ref = _normalise_motion(ref_signatures)
+    dist = _normalise_motion(dist_signatures)
+
+    size = 1 << int(len(ref) + len(dist) - 1).bit_length()
+    spectrum = np.fft.rfft(ref, size, axis=0) * np.conj(np.fft.rfft(dist, size, axis=0))
+    circular = np.fft.irfft(spectrum, size, axis=0).sum(axis=1)
+
+    # lag is where the first distorted signature lands in the reference block;
+    # negative lags, the distorted clip starting earlier, wrap around to the end of the circular correlation
+    lags = np.arange(-(len(dist) - 1), len(ref))
+    correlation = np.concatenate([circular[size - len(dist) + 1:], circular[:len(ref)]])
+    offsets = lags - dist_position
+    dist_first = np.maximum(0, -lags)
+    overlap = np.minimum(len(dist), len(ref) - lags) - dist_first
+
+    # only consider offsets in range that overlap at least half of the window
+    valid = (np.abs(offsets) <= max_offset) & (overlap >= max(2, len(dist) // 2))
+
+    if not valid.any():
+        raise ValueError("No offset within max_offset has enough overlap.")
+
+    score = np.where(valid, correlation / np.maximum(overlap, 1), -np.inf)
+    best = int(np.argmax(score))
+    first, ref_first = dist_first[best], max(0, int(lags[best]))
+
+    a = dist[first:first + overlap[best]].ravel()
+    b = ref[ref_first:ref_first + overlap[best]].ravel()
+    confidence = float(np.corrcoef(a, b)[0, 1]) if a.std() > 0 and b.std() > 0 else 0.0
+
+    return int(offsets[best]), max(0.0, confidence)
+
+
+def banding_mask(
+    clip: vs.VideoNode | CAMBI.CAMBIVideoNode,
     scale: int = 2,
     **cambi_args: Any
 ) -> vs.VideoNode:
     """
     Generates a banding mask from a given video clip.
  
-    :param clip         The clip to process.
+    Passing the node returned by ``CAMBI.calculate()`` reuses its CAMBI pass, so scoring
+    and masking the same clip runs CAMBI once. The mask is cached on the node.
+ 
+    :param clip         The clip to process, or a node returned by ``CAMBI.calculate()``.
     :param scale:       The scale factor for the merging operation.
-    :param cambi_args:  Additional arguments to be passed to the Cambi filter.
+    :param cambi_args:  Additional arguments to be passed to CAMBI. Ignored when given a node.
  
     :return:            A banding mask for the input video clip.
     """
  
+    if isinstance(clip, CAMBI.CAMBIVideoNode):
+        return clip.mask(scale, Catrom)
+ 
     cambi_args = dict(topk=0.1, tvi_threshold=0.012) | cambi_args
  
     if clip.format.bits_per_sample > 10:  # type: ignore
         clip = depth(clip, 10)
  
-    cambi = core.akarin.Cambi(clip, scores=True, **cambi_args)
- 
-    cambi_masks = [
-        Catrom.scale(cambi.std.PropToClip('CAMBI_SCALE%d' % i), clip.width, clip.height)
-        for i in range(5)
-    ]
- 
-    banding_mask = combine(
-        cambi_masks, ExprOp.ADD, zip(range(1, 6), ExprOp.LOG, ExprOp.MUL),
-        expr_suffix=[ExprOp.SQRT, scale, ExprOp.LOG, ExprOp.MUL]
-    ).std.Convolution([1, 2, 1, 2, 4, 2, 1, 2, 1])
- 
-    return merge_clip_props(banding_mask, cambi)
\ No newline at end of file
+    return CAMBI(**cambi_args).calculate(clip).mask(scale, Catrom)
\ No newline at end of file
@@ -36,7 +36,7 @@ class SSIMULACRA:
     METHODS = {
         Provider.SSIMULACRA1: lambda reference, distorted: core.julek.SSIMULACRA(reference, distorted, feature=1),
         Provider.SSIMULACRA2: lambda reference, distorted: core.julek.SSIMULACRA(reference, distorted, feature=0),
-        Provider.SSIMULACRA2_ZIG: core.ssimulacra2.SSIMULACRA2,
+        Provider.SSIMULACRA2_ZIG: lambda reference, distorted: core.ssimulacra2.SSIMULACRA2(reference, distorted),
     }
 
     def __init__(
@@ -105,9 +105,10 @@ class BUTTERAUGLI:
     ]
 
     class BUTTERAUGLIVideoNode(MetricVideoNode):
-        def __init__(self, clips: list[vs.VideoNode], metric) -> None:
-            super().__init__(clips[0], metric)
-            self._map = clips[1]
+        def __init__(self, clip: vs.VideoNode, metric, butteraugli_args: dict) -> None:
+            super().__init__(clip, metric, inputs=[butteraugli_args['reference'], butteraugli_args['distorted']])
+            self._butteraugli_args = butteraugli_args
+            self._map: vs.VideoNode | None = None
 
         def heatmap(self) -> vs.VideoNode:
             """Returns the heatmap representing the differences between the two clips.
@@ -116,8 +117,11 @@ class BUTTERAUGLI:
                 vs.VideoNode: Heatmap clip representing the differences between the two clips.
 
             Notes:
-                * This method should be called after the 'calculate' method has been called.
+                * The heatmap is only built when first requested, so scoring alone never renders it.
             """
+            if self._map is None:
+                self._map = core.julek.Butteraugli(**self._butteraugli_args, distmap=True)
+
             return self._map
     
     def calculate(
@@ -127,13 +131,14 @@ class BUTTERAUGLI:
         linear: bool = False
     ) -> BUTTERAUGLIVideoNode | vs.VideoNode:
 
-        heatmap = core.julek.Butteraugli(
+        butteraugli_args = dict(
             reference=reference,
             distorted=distorted,
             intensity_target=intensity_target,
-            linput=linear,
-            distmap=True
+            linput=linear
         )
+
+        measure = core.julek.Butteraugli(**butteraugli_args, distmap=False)
         
-        clip = distorted.std.CopyFrameProps(prop_src=heatmap, props="_FrameButteraugli")
-        return self.BUTTERAUGLIVideoNode([clip, heatmap], self)
+        clip = distorted.std.CopyFrameProps(prop_src=measure, props="_FrameButteraugli")
+        return self.BUTTERAUGLIVideoNode(clip, self, butteraugli_args)
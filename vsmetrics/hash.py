@@ -1,9 +1,10 @@
-import cv2
 import numpy as np
-from vstools import vs, core
-from .meta import MetricVideoNode, validate_format
+from numpy.typing import NDArray
+from vstools import vs, core, clip_async_render
+from .arrays import as_dtype, read_plane
+from .meta import BaseUtil, MetricVideoNode, validate_format, resolve_async_requests
 
-class Hash_3117:
+class Hash_3117(BaseUtil):
     """
     31 + 17 ID system
     by DZgas
@@ -17,66 +18,238 @@ class Hash_3117:
 
         validate_format(reference, formats=self.formats)
         validate_format(distorted, formats=self.formats)
-        
-        clip = core.std.ModifyFrame(clip=reference, clips=[reference, distorted], selector=self.perceptual_hash_3117)
+
+        self.planes = [0]
+
+        clip = core.std.ModifyFrame(clip=reference, clips=[reference, distorted], selector=self._process_frame)
         clip = core.std.CopyFrameProps(distorted, clip, props=self.props)
 
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference, distorted])
+
+    def signatures(self, clip: vs.VideoNode, async_requests: int | None = None) -> NDArray[np.uint8]:
+        """
+        Renders a clip once and returns the signature of every frame as a (num_frames, 48) array.
+        """
+        validate_format(clip, formats=self.formats)
+
+        signatures = np.empty((clip.num_frames, 48), dtype=np.uint8)
+
+        def _store(n: int, f: vs.VideoFrame) -> None:
+            signatures[n] = self.signature(as_dtype(read_plane(f, 0), np.float32, 'hash'))
+
+        clip_async_render(
+            clip=clip,
+            outfile=None,
+            progress='Hashing frames...',
+            callback=_store,
+            async_requests=resolve_async_requests(async_requests)
+        )
+
+        return signatures
 
     def perceptual_hash_3117(self, n: int, f: list[vs.VideoFrame]) -> vs.VideoFrame:
-        f1, f2 = f
+        return self._process_frame(n, f)
+
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, int]:
+        reference, distorted = arrays
 
-        def calculate_hash(image):
-            image_v = cv2.resize(image, (31, 31), interpolation=cv2.INTER_LANCZOS4)
-            pixels = image_v.flatten()
-            vertical_avg_pixels = [sum(pixels[i::31]) / 31 for i in range(31)]
+        hash1 = self.signature(as_dtype(reference, np.float32, 'hash_reference'))
+        hash2 = self.signature(as_dtype(distorted, np.float32, 'hash_distorted'))
 
-            image_h = cv2.resize(image, (17, 17), interpolation=cv2.INTER_LANCZOS4)
-            pixels = image_h.flatten()
-            horizontal_avg_pixels = [sum(pixels[i * 17:(i + 1) * 17]) / 17 for i in range(17)]
+        return {self.props[0]: self.calculate_difference(hash1, hash2)}
 
-            vertical_avg_pixels = self.expand_to_range(vertical_avg_pixels)
-            horizontal_avg_pixels = self.expand_to_range(horizontal_avg_pixels)
+    def signature(self, image: NDArray[np.float32]) -> NDArray[np.uint8]:
+        """
+        Returns the 48 byte hash of a plane: 31 column averages followed by 17 row averages,
+        each stretched to 0-255.
+        """
+        import cv2
 
-            vertical_hex_values = "".join(hex(int(pixel))[2:].zfill(2) for pixel in vertical_avg_pixels)
-            horizontal_hex_values = "".join(hex(int(pixel))[2:].zfill(2) for pixel in horizontal_avg_pixels)
+        image_v = cv2.resize(image, (31, 31), interpolation=cv2.INTER_LANCZOS4)
+        image_h = cv2.resize(image, (17, 17), interpolation=cv2.INTER_LANCZOS4)
 
-            hash_value = vertical_hex_values + horizontal_hex_values
+        # reducing over the outer axis adds the values in order,
+        # which keeps float32 rounding identical to summing them one by one
+        vertical_avg_pixels = image_v.sum(axis=0) / np.float32(31)
+        horizontal_avg_pixels = np.ascontiguousarray(image_h.T).sum(axis=0) / np.float32(17)
 
-            return hash_value
+        return np.concatenate((
+            self.expand_to_range(vertical_avg_pixels),
+            self.expand_to_range(horizontal_avg_pixels)
+        ))
 
-        arr1 = np.asarray(f1).astype(np.float32)
-        arr2 = np.asarray(f2).astype(np.float32)
+    def calculate_difference(self, hash1: NDArray[np.uint8], hash2: NDArray[np.uint8]) -> int:
+        return int(np.abs(hash1.astype(np.int16) - hash2).sum())
 
-        hash1 = calculate_hash(arr1[0])
-        hash2 = calculate_hash(arr2[0])
+    def expand_to_range(self, numbers: NDArray[np.float32]) -> NDArray[np.uint8]:
+        min_num = numbers.min()
+        max_num = numbers.max()
 
-        dec_values1 = self.hex_to_dec(hash1)
-        dec_values2 = self.hex_to_dec(hash2)
+        if max_num - min_num == 0:
+            return np.clip(np.rint(numbers), 0, 255).astype(np.uint8)
 
-        difference = self.calculate_difference(dec_values1, dec_values2)
+        return np.rint((numbers - min_num) / (max_num - min_num) * 255).astype(np.uint8)
 
-        fout1 = f1.copy() # type: ignore
-        fout1.props.Hash_3117 = int(difference)
 
-        return fout1
+class HashIndex:
+    """
+    Nearest-neighbour index over Hash_3117 signatures under L1 distance.
 
-    def hex_to_dec(self, hex_str) -> list[int]:
-        return [int(hex_str[i:i+2], 16) for i in range(0, len(hex_str), 2)]
+    Signatures of any number of clips are kept in one (N, 48) uint8 array. Queries are pruned with
+    sorted projections: for a weight vector w with entries in {-1, 1}, |w·a - w·b| <= L1(a, b),
+    so only entries whose projections all lie within the search radius need an exact distance.
+    """
 
-    def calculate_difference(self, numbers1, numbers2):
-        result = 0
+    def __init__(self, projections: int = 4, seed: int = 3117):
+        """
+        :param projections:     Number of projections used for pruning. The first one is the plain sum.
+        :param seed:            Seed of the random sign vectors of the other projections.
+        """
+        rng = np.random.default_rng(seed)
+        weights = rng.choice(np.array([-1, 1], dtype=np.int32), size=(projections, 48))
+        weights[0] = 1
+
+        self.weights = weights
+        self.labels: list[str] = []
+
+        self._pending: list[tuple[NDArray[np.uint8], int]] = []
+        self._signatures = np.empty((0, 48), dtype=np.uint8)
+        self._label_ids = np.empty(0, dtype=np.int32)
+        self._frames = np.empty(0, dtype=np.int32)
+        self._projections = np.empty((0, projections), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._signatures) + sum(len(signatures) for signatures, _ in self._pending)
+
+    def add(self, signatures: NDArray[np.uint8], label: str) -> None:
+        """
+        Adds the per-frame signatures of a clip, as returned by ``Hash_3117.signatures``.
+        """
+        if label in self.labels:
+            raise ValueError(f"Label '{label}' is already indexed.")
+
+        self.labels.append(label)
+        self._pending.append((np.asarray(signatures, dtype=np.uint8), len(self.labels) - 1))
+
+    def query(self, signatures: NDArray[np.uint8], k: int = 1, radius: int | None = None) -> list[list[tuple[int, str, int]]]:
+        """
+        Finds the nearest indexed frames of every query signature.
+
+        :param signatures:  A (48,) signature or a (Q, 48) array of them.
+        :param k:           Number of neighbours returned per query.
+        :param radius:      Only return neighbours within this L1 distance.
+                            Without a radius the k nearest are always returned.
+
+        :return:            Per query, up to k ``(distance, label, frame)`` tuples sorted by distance.
+        """
+        self._build()
+
+        queries = np.atleast_2d(np.asarray(signatures, dtype=np.uint8))
+
+        return [self._query(q, k, radius) for q in queries]
+
+    def match(self, signatures: NDArray[np.uint8], radius: int = 64, top: int = 5) -> list[tuple[str, int, int]]:
+        """
+        Pairs a clip with the indexed clips it most likely comes from.
+
+        Every query frame votes for the (label, offset) of its nearest neighbour within ``radius``.
+
+        :return:    Up to ``top`` ``(label, offset, votes)`` tuples, where ``offset`` is the indexed
+                    frame number minus the query frame number, sorted by votes.
+        """
+        votes: dict[tuple[str, int], int] = {}
+
+        for n, neighbours in enumerate(self.query(signatures, k=1, radius=radius)):
+            for _, label, frame in neighbours:
+                votes[(label, frame - n)] = votes.get((label, frame - n), 0) + 1
+
+        ranked = sorted(votes.items(), key=lambda item: item[1], reverse=True)[:top]
+
+        return [(label, offset, count) for (label, offset), count in ranked]
+
+    def save(self, filepath) -> None:
+        self._build()
+
+        np.savez_compressed(
+            filepath,
+            weights=self.weights,
+            labels=np.array(self.labels, dtype=str),
+            signatures=self._signatures,
+            label_ids=self._label_ids,
+            frames=self._frames
+        )
+
+    @classmethod
+    def load(cls, filepath) -> "HashIndex":
+        with np.load(filepath) as data:
+            index = cls(projections=len(data['weights']))
+            index.weights = data['weights']
+            index.labels = data['labels'].tolist()
+            index._signatures = data['signatures']
+            index._label_ids = data['label_ids']
+            index._frames = data['frames']
+
+        index._projections = index._signatures.astype(np.int32) @ index.weights.T
+        index._reorder(np.argsort(index._projections[:, 0], kind='stable'))
+
+        return index
+
+    def _build(self) -> None:
+        if not self._pending:
+            return
+
+        signatures = [self._signatures, *(s for s, _ in self._pending)]
+        label_ids = [self._label_ids, *(np.full(len(s), i, dtype=np.int32) for s, i in self._pending)]
+        frames = [self._frames, *(np.arange(len(s), dtype=np.int32) for s, _ in self._pending)]
+
+        self._pending = []
+        self._signatures = np.concatenate(signatures)
+        self._label_ids = np.concatenate(label_ids)
+        self._frames = np.concatenate(frames)
+        self._projections = self._signatures.astype(np.int32) @ self.weights.T
 
-        for i in range(len(numbers1)):
-            result += abs(numbers1[i] - numbers2[i])
+        self._reorder(np.argsort(self._projections[:, 0], kind='stable'))
+
+    def _reorder(self, order: NDArray) -> None:
+        self._signatures = self._signatures[order]
+        self._label_ids = self._label_ids[order]
+        self._frames = self._frames[order]
+        self._projections = self._projections[order]
 
-        return result
+    def _query(self, signature: NDArray[np.uint8], k: int, radius: int | None) -> list[tuple[int, str, int]]:
+        if not len(self._signatures):
+            return []
 
-    def expand_to_range(self, numbers) -> list[int]:
-        min_num = min(numbers)
-        max_num = max(numbers)
+        projection = self.weights @ signature.astype(np.int32)
+
+        if radius is None:
+            # the k-th closest of the entries nearest in the primary projection bounds the search radius,
+            # and everything within that radius is then found exactly
+            window = max(16 * k, 256)
+            centre = np.searchsorted(self._projections[:, 0], projection[0])
+            seeds = self._signatures[max(0, centre - window):centre + window]
+            seed_distances = np.abs(seeds.astype(np.int16) - signature).sum(axis=1, dtype=np.int32)
+            radius = int(np.partition(seed_distances, min(k, len(seeds)) - 1)[min(k, len(seeds)) - 1])
 
-        if max_num - min_num == 0:
-            return [round(num) for num in numbers]
+        distances, candidates = self._within(signature, projection, radius)
+
+        best = np.argsort(distances, kind='stable')[:k]
+
+        return [
+            (int(distances[i]), self.labels[self._label_ids[candidates[i]]], int(self._frames[candidates[i]]))
+            for i in best
+        ]
+
+    def _within(self, signature: NDArray[np.uint8], projection: NDArray[np.int32], radius: int) -> tuple[NDArray, NDArray]:
+        keys = self._projections[:, 0]
+        lo = np.searchsorted(keys, projection[0] - radius, side='left')
+        hi = np.searchsorted(keys, projection[0] + radius, side='right')
+
+        candidates = np.arange(lo, hi)
+        keep = np.all(np.abs(self._projections[lo:hi, 1:] - projection[1:]) <= radius, axis=1)
+        candidates = candidates[keep]
+
+        distances = np.abs(self._signatures[candidates].astype(np.int16) - signature).sum(axis=1, dtype=np.int32)
+        within = distances <= radius
 
-        return [round(((num - min_num) / (max_num - min_num)) * 255) for num in numbers]
+        return distances[within], candidates[within]
@@ -1,6 +1,125 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import TYPE_CHECKING
 from vstools import vs, core, clip_async_render
+import json
 import os
-import pandas as pd
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+# pandas is only needed once scores are read or written
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Default number of frames requested concurrently when collecting scores.
+# None follows the core's thread count.
+ASYNC_REQUESTS: int | None = None
+
+
+def set_async_requests(requests: int | None) -> None:
+    """
+    Sets the default number of concurrent frame requests used by every MetricVideoNode.
+
+    :param requests:    Frames in flight, or None to follow ``core.num_threads``.
+    """
+    global ASYNC_REQUESTS
+
+    if requests is not None and requests < 1:
+        raise ValueError("async_requests must be at least 1")
+
+    ASYNC_REQUESTS = requests
+
+
+# Default ScoreCache consulted by every MetricVideoNode. None disables caching.
+SCORE_CACHE = None
+
+
+def set_score_cache(cache) -> None:
+    """
+    Sets the ScoreCache used by every MetricVideoNode that doesn't have its own ``cache``.
+
+    :param cache:   A ScoreCache, or None to disable caching.
+    """
+    global SCORE_CACHE
+
+    SCORE_CACHE = cache
+
+
+def resolve_async_requests(*requests: int | None) -> int:
+    """
+    Returns the first explicit request count, then the module default, then the core's thread count.
+    """
+    for value in (*requests, ASYNC_REQUESTS):
+        if value is not None:
+            return value
+
+    return core.num_threads
+
+
+def collect_props(
+    clip: vs.VideoNode,
+    props: list[str],
+    dtype: DTypeLike = np.float64,
+    async_requests: int | None = None,
+    progress: str | None = 'Getting frame props...'
+) -> dict[str, NDArray]:
+    """
+    Renders a clip and gathers the requested frame props into preallocated columns.
+
+    Frames missing a prop are left as NaN. Every other prop on the frame is ignored.
+
+    :param clip:            The clip to render.
+    :param props:           Names of the props to collect.
+    :param dtype:           Floating point type of the columns.
+    :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+    :param progress:        Progress bar label, or None to render silently.
+
+    :return:                A mapping of prop name to a column of ``clip.num_frames`` values.
+    """
+    columns = {prop: np.full(clip.num_frames, np.nan, dtype=dtype) for prop in props}
+
+    def _store(n: int, f: vs.VideoFrame) -> None:
+        for prop, column in columns.items():
+            value = f.props.get(prop)
+
+            if value is not None:
+                column[n] = value
+
+    clip_async_render(
+        clip=clip,
+        outfile=None,
+        progress=progress,
+        callback=_store,
+        async_requests=resolve_async_requests(async_requests)
+    )
+
+    return columns
+
+
+def read_results(filepath, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Reads scores written by ``write_csv`` or ``write_parquet``, indexed by frame.
+
+    Parquet files are memory-mapped and only the requested columns are decoded.
+
+    :param filepath:    A ``.csv`` or ``.parquet`` file.
+    :param columns:     Columns to load. Defaults to all of them.
+    """
+    import pandas as pd
+
+    if str(filepath).endswith('.parquet'):
+        return pd.read_parquet(
+            filepath,
+            columns=None if columns is None else ['Frame', *columns],
+            memory_map=True
+        ).set_index('Frame')
+
+    return pd.read_csv(
+        filepath,
+        index_col='Frame',
+        usecols=None if columns is None else ['Frame', *columns]
+    )
 
 
 def validate_format(input: vs.VideoNode, formats: tuple[int, ...] | int):
@@ -14,6 +133,17 @@ def validate_format(input: vs.VideoNode, formats: tuple[int, ...] | int):
 
 
 class BaseUtil:
+    # set by a ProcessPool to run _frame_props in its worker processes
+    _executor = None
+
+    @staticmethod
+    def _normalise_planes(planes: list[int] | int) -> list[int]:
+        """
+        Sorts and deduplicates the requested planes into the channel order ``_generate_props`` names them in,
+        so per-plane results line up with their props.
+        """
+        return sorted({planes} if isinstance(planes, int) else set(planes))
+
     def _generate_props(self, props: list[str], color_family: int, planes: list[int]) -> list[str]:
         if color_family == vs.GRAY:
             return props
@@ -28,41 +158,190 @@ class BaseUtil:
         
         return [f"{prop}_{channel}" for prop in props for i, channel in enumerate(channel_mapping) if i in planes]
 
+    def _frame_arrays(self, frames: list[vs.VideoFrame]) -> list[NDArray]:
+        """
+        The planes handed to ``_frame_props``: each plane in ``self.planes`` of each input frame, frame by frame.
+        """
+        from .arrays import read_planes
+
+        return read_planes(frames, getattr(self, 'planes', [0]))
+
+    def _frame_props(self, arrays: list[NDArray]) -> dict[str, float]:
+        """
+        Scores one frame from its plane arrays. Must not touch frames or nodes, so it can run in a worker process.
+        """
+        raise NotImplementedError
+
+    def _process_frame(self, n: int, f: vs.VideoFrame | list[vs.VideoFrame]) -> vs.VideoFrame:
+        frames = [f] if isinstance(f, vs.VideoFrame) else list(f)
+        arrays = self._frame_arrays(frames)
+
+        if self._executor is None:
+            props = self._frame_props(arrays)
+        else:
+            props = self._executor.submit(arrays)
+
+        fout = frames[0].copy()
+
+        for prop, value in props.items():
+            fout.props[prop] = value
+
+        return fout
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop('_executor', None)
+        return state
+
 
 class MetricVideoNode:
-    def __init__(self, clip: vs.VideoNode, metric):
+    # False for nodes whose scores are read from elsewhere, e.g. a log, rather than from their clip's frame props
+    props_on_frames: bool = True
+
+    def __init__(
+        self,
+        clip: vs.VideoNode,
+        metric,
+        async_requests: int | None = None,
+        dtype: DTypeLike = np.float64,
+        inputs: list[vs.VideoNode] | None = None
+    ):
         self._clip: vs.VideoNode = clip
         self._metric = metric
+        # the clips the metric was calculated from, which identify the scores without computing any
+        self.inputs = inputs
         self._data: pd.DataFrame | None = None
+        self.async_requests = async_requests
+        self.dtype = dtype
+        self.cache = None
+        self.source: str | None = None
+        self._results: str | None = None
 
     def name(self):
         return self.__class__.__name__
 
-    def write_csv(self, filepath, overwrite=False, exclusive: bool = False) -> None:
+    def write_csv(
+        self,
+        filepath,
+        overwrite=False,
+        exclusive: bool = False,
+        async_requests: int | None = None,
+        chunk_size: int = 1000
+    ) -> None:
+        """
+        Writes the scores to CSV, streaming them to disk in chunks as frames finish.
+
+        A ``<filepath>.checkpoint`` file records how far the run got. Re-running with the
+        same metric and clip resumes after the last flushed chunk instead of starting over.
+
+        :param filepath:        Output file.
+        :param overwrite:       Discard an existing file and checkpoint and render from scratch.
+        :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+        :param chunk_size:      Number of frames rendered and flushed at a time.
+        """
+        file_path = os.path.abspath(filepath)
+        checkpoint_path = f"{file_path}.checkpoint"
+
+        if os.path.exists(file_path) and not overwrite and not os.path.exists(checkpoint_path):
+            self._results = file_path
+            return
+
+        self._ensure_data()
+
+        cached = self._load_cached() if self._data is None else None
+
+        if self._data is not None:
+            self._data.to_csv(file_path, index_label='Frame', index=True)
+            self._results = file_path
+
+            # a checkpoint left by an earlier failed run would otherwise truncate the complete file on the next call
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+
+            return
+
+        self._stream_csv(file_path, checkpoint_path, overwrite, async_requests, chunk_size)
+
+        if cached is not None:
+            # resumed runs only rendered part of the file, so the cache entry is read back from it
+            data = read_results(file_path)
+            cached[0].put(cached[1], {prop: data[prop].to_numpy(self.dtype) for prop in data.columns})
+
+    def write_parquet(
+        self,
+        filepath,
+        overwrite: bool = False,
+        async_requests: int | None = None,
+        chunk_size: int = 1000,
+        compression: str = 'zstd'
+    ) -> None:
+        """
+        Writes the scores to a compressed Parquet file with float32 columns.
+
+        Every chunk of frames becomes a row group as soon as it finishes. The file is written
+        under a ``.part`` name and only moved into place once complete. Requires pyarrow.
+
+        :param filepath:        Output file.
+        :param overwrite:       Replace an existing file instead of reusing it.
+        :param async_requests:  Frames in flight, see ``resolve_async_requests``.
+        :param chunk_size:      Number of frames rendered and flushed at a time.
+        :param compression:     Parquet compression codec.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
         file_path = os.path.abspath(filepath)
 
         if os.path.exists(file_path) and not overwrite:
-            if self._data is None:
-                self._data = pd.read_csv(file_path)
+            self._results = file_path
             return
 
-        if self._data is None:
-            self._collect_data()
+        self._ensure_data()
+
+        cached = self._load_cached() if self._data is None else None
+
+        props = metric_props(self._metric)
+        chunks: dict[str, list[NDArray]] = {prop: [] for prop in props}
+        schema = pa.schema([('Frame', pa.int64()), *[(prop, pa.float32()) for prop in props]])
+        temp_path = f"{file_path}.part"
+
+        with pq.ParquetWriter(temp_path, schema, compression=compression) as writer:
+            if self._data is not None:
+                columns = {prop: self._data[prop].to_numpy(np.float32) for prop in props}
+                writer.write_table(pa.table(dict(Frame=self._data.index.to_numpy(np.int64), **columns), schema=schema))
+            else:
+                for first in range(0, self._clip.num_frames, chunk_size):
+                    last = min(first + chunk_size, self._clip.num_frames)
+
+                    columns = collect_props(
+                        self._clip[first:last],
+                        props,
+                        self.dtype,
+                        resolve_async_requests(async_requests, self.async_requests),
+                        progress=f'Getting frame props ({first}/{self._clip.num_frames})...'
+                    )
+
+                    for prop, column in columns.items():
+                        chunks[prop].append(column)
 
-        self._data.to_csv(file_path, index_label='Frame', index=True)
+                    columns = {prop: column.astype(np.float32) for prop, column in columns.items()}
+                    writer.write_table(pa.table(dict(Frame=np.arange(first, last, dtype=np.int64), **columns), schema=schema))
 
-    def print_statistics(self):
+        os.replace(temp_path, file_path)
+        self._results = file_path
+
+        if cached is not None and self._data is None:
+            cached[0].put(cached[1], {prop: np.concatenate(chunk) for prop, chunk in chunks.items()})
+
+    def print_statistics(self, async_requests: int | None = None):
         """
         Automatically calculate and print the statistics for all configured properties.
         """
 
         if self._data is None:
-            self._collect_data()
-
-        if not hasattr(self._metric, 'props') or not self._metric.props:
-            raise ValueError("Metric properties not configured.")
+            self._collect_data(async_requests)
 
-        for column_name in self._metric.props:
+        for column_name in metric_props(self._metric):
             if column_name not in self._data.columns:
                 raise ValueError(f"Column '{column_name}' not found in the data.")
             print(f"Statistics for {column_name}:")
@@ -79,16 +358,16 @@ class MetricVideoNode:
             print(f"5th Percentile: {percentile_5th_val}")
             print(f"95th Percentile: {percentile_95th_val}\n")
 
-    def plot(self, props: str = None, normalize: bool = False, scale_relative: bool = False) -> None:
+    def plot(self, props: str = None, normalize: bool = False, scale_relative: bool = False, async_requests: int | None = None) -> None:
         import matplotlib.pyplot as plt
         
         if self._data is None:
-            self._collect_data()
+            self._collect_data(async_requests)
 
         frames = range(len(self._data))
     
         if props is None:
-            props = self._metric.props
+            props = metric_props(self._metric)
 
         fig, ax1 = plt.subplots()
     
@@ -137,17 +416,245 @@ class MetricVideoNode:
         plt.tight_layout()
         plt.show()
         
-    def _collect_data(self):
+    def _checkpoint_key(self) -> dict:
+        from .cache import clip_identity
+
+        props = metric_props(self._metric)
+
+        return {
+            'metric': self._metric.__class__.__name__,
+            'params': metric_params(self._metric),
+            'props': props,
+            **clip_identity(self._clip, self.inputs, self.source),
+        }
+
+    def _stream_csv(
+        self,
+        file_path: str,
+        checkpoint_path: str,
+        overwrite: bool,
+        async_requests: int | None,
+        chunk_size: int
+    ) -> None:
+        import pandas as pd
+
+        props = metric_props(self._metric)
+        key = self._checkpoint_key()
+        start, offset = 0, 0
+
+        if not overwrite and os.path.exists(checkpoint_path) and os.path.exists(file_path):
+            with open(checkpoint_path, 'r') as f:
+                state = json.load(f)
+
+            if state['key'] == key:
+                start, offset = state['frames'], state['offset']
+
+        with open(file_path, 'r+b' if start else 'wb') as f:
+            # anything past the last checkpoint belongs to a chunk that never completed
+            f.truncate(offset)
+            f.seek(offset)
+
+            if not start:
+                f.write(pd.DataFrame(columns=props).to_csv(index_label='Frame').encode())
+                f.flush()
+                os.fsync(f.fileno())
+
+                # a header without a checkpoint would pass for a finished file if the first chunk fails
+                self._write_checkpoint(checkpoint_path, dict(key=key, frames=0, offset=f.tell()))
+
+            for first in range(start, self._clip.num_frames, chunk_size):
+                last = min(first + chunk_size, self._clip.num_frames)
+
+                columns = collect_props(
+                    self._clip[first:last],
+                    props,
+                    self.dtype,
+                    resolve_async_requests(async_requests, self.async_requests),
+                    progress=f'Getting frame props ({first}/{self._clip.num_frames})...'
+                )
+
+                chunk = pd.DataFrame(columns, index=pd.RangeIndex(first, last), copy=False)
+                f.write(chunk.to_csv(header=False).encode())
+                f.flush()
+                os.fsync(f.fileno())
+
+                self._write_checkpoint(checkpoint_path, dict(key=key, frames=last, offset=f.tell()))
+
+        os.remove(checkpoint_path)
+        self._results = file_path
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_path: str, state: dict) -> None:
+        temp_path = f"{checkpoint_path}.tmp"
+
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+
+        os.replace(temp_path, checkpoint_path)
+
+    def _ensure_data(self) -> None:
+        """
+        Fills ``self._data`` for nodes whose scores don't come from frame props. Nothing to do for the rest.
+        """
+
+    def _load_cached(self) -> tuple | None:
+        """
+        Fills ``self._data`` from the score cache on a hit and returns the (cache, key) pair, if caching is enabled.
+        """
+        import pandas as pd
+
+        cache = self.cache if self.cache is not None else SCORE_CACHE
+
+        if cache is None:
+            return None
+
+        key = cache.key(self._clip, self._metric, metric_props(self._metric), self.source, self.inputs)
+        columns = cache.get(key)
+
+        if columns is not None:
+            self._data = pd.DataFrame(columns, copy=False)
+
+        return cache, key
+
+    def _collect_data(self, async_requests: int | None = None):
+        import pandas as pd
+
+        if self._results is not None and os.path.exists(self._results):
+            self._data = read_results(self._results)
+            return
+
+        self._ensure_data()
+
+        cached = self._load_cached() if self._data is None else None
+
+        if self._data is not None:
+            return
 
-        self._data = clip_async_render(
-            clip=self._clip,
-            outfile=None,
-            progress='Getting frame props...',
-            callback=lambda _, f: f.props.copy(),
-            async_requests=1
-        ) # type: ignore
+        # columns are written by frame number,
+        # so the order does not depend on how many requests are in flight
+        columns = collect_props(
+            self._clip,
+            metric_props(self._metric),
+            self.dtype,
+            resolve_async_requests(async_requests, self.async_requests)
+        )
 
-        self._data = pd.DataFrame(self._data)
+        if cached is not None:
+            cached[0].put(cached[1], columns)
+
+        self._data = pd.DataFrame(columns, copy=False)
 
     def __getattr__(self, name):
-        return getattr(self._clip, name)
\ No newline at end of file
+        return getattr(self._clip, name)
+
+
+_SKIP = object()
+
+
+def metric_params(metric) -> dict:
+    """
+    Returns the public, plain-valued settings of a metric, e.g. ``PSNR.weights`` or ``CAMBI.window_size``.
+
+    Models, callables and other objects that don't serialise are skipped.
+    """
+    def _plain(value):
+        if isinstance(value, Enum):
+            return _plain(value.value)
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (list, tuple)):
+            values = [_plain(v) for v in value]
+            return values if all(v is not _SKIP for v in values) else _SKIP
+        return _SKIP
+
+    params = {}
+
+    for name, value in sorted(vars(metric).items()):
+        if name.startswith('_'):
+            continue
+
+        value = _plain(value)
+
+        if value is not _SKIP:
+            params[name] = value
+
+    return params
+
+
+def metric_props(metric) -> list[str]:
+    """
+    Returns the frame props a metric writes, whether it exposes them as ``get_props()``, ``props`` or a single ``prop``.
+    """
+    if callable(getattr(metric, 'get_props', None)):
+        return list(metric.get_props())
+
+    props = getattr(metric, 'props', None)
+
+    if props is None and hasattr(metric, 'prop'):
+        props = [metric.prop]
+
+    if not props:
+        raise ValueError(f"{metric.__class__.__name__} does not declare any props.")
+
+    return list(props)
+
+
+class MetricGroup:
+    """
+    Several metrics scored from the same render.
+    """
+
+    def __init__(self, metrics: list, props: list[list[str]]):
+        self.metrics = metrics
+        self.metric_props = props
+        self.props: list[str] = [prop for group in props for prop in group]
+
+        if len(set(self.props)) != len(self.props):
+            raise ValueError(f"Metrics write overlapping props: {self.props}")
+
+
+class MultiMetricVideoNode(MetricVideoNode):
+    """
+    Merges the props of several metric nodes onto one clip,
+    so a single render collects every score.
+    """
+
+    def __init__(self, clip: vs.VideoNode, metrics: list, nodes: list[vs.VideoNode | MetricVideoNode]):
+        props = [metric_props(node._metric if isinstance(node, MetricVideoNode) else metric) for metric, node in zip(metrics, nodes)]
+
+        for node, node_props in zip(nodes, props):
+            if isinstance(node, MetricVideoNode):
+                if not node.props_on_frames:
+                    raise ValueError(
+                        f"{node._metric.__class__.__name__} scores are not frame props, so it can't be grouped. Score it on its own."
+                    )
+
+                node = node._clip
+
+            clip = clip.std.CopyFrameProps(prop_src=node, props=node_props)
+
+        # the group is only identified by its inputs if every member is
+        inputs: list[vs.VideoNode] | None = None
+
+        if all(isinstance(node, MetricVideoNode) and node.inputs for node in nodes):
+            inputs = []
+
+            for node in nodes:
+                inputs += [c for c in node.inputs if not any(c is known for known in inputs)]  # type: ignore
+
+        super().__init__(clip, MetricGroup(metrics, props), inputs=inputs)
+        self.nodes = nodes
+
+    def scores(self, metric, async_requests: int | None = None) -> pd.DataFrame:
+        """
+        Returns the columns belonging to one of the grouped metrics.
+        """
+        if self._data is None:
+            self._collect_data(async_requests)
+
+        index = next((i for i, m in enumerate(self._metric.metrics) if m is metric), None)
+
+        if index is None:
+            raise ValueError(f"{metric.__class__.__name__} is not one of the grouped metrics.")
+
+        return self._data[self._metric.metric_props[index]]
\ No newline at end of file
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Hashable
+
+# Networks and model files shared by every metric instance in the process.
+# Entries are treated as read-only once loaded.
+_MODELS: dict[Hashable, Any] = {}
+_LOCK = threading.Lock()
+_LOADING: dict[Hashable, threading.Lock] = {}
+
+
+def get_model(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """
+    Returns the model registered under ``key``, calling ``loader`` to load it on first use.
+
+    Concurrent callers for the same key wait for a single load; different keys load in parallel.
+
+    :param key:     Hashable identifier, e.g. ``('lpips', 'alex')``.
+    :param loader:  Zero-argument callable that builds the model.
+    """
+    try:
+        return _MODELS[key]
+    except KeyError:
+        pass
+
+    with _LOCK:
+        lock = _LOADING.setdefault(key, threading.Lock())
+
+    with lock:
+        if key not in _MODELS:
+            _MODELS[key] = loader()
+
+        return _MODELS[key]
+
+
+def preload_models(*metrics) -> None:
+    """
+    Loads the models of the given metric instances up front, e.g. in a worker initializer,
+    so the first frame does not pay for reading weights from disk.
+    """
+    for metric in metrics:
+        get_model(metric.model_key, metric._load_model)
+
+
+def release_models(*keys: Hashable) -> None:
+    """
+    Drops models from the registry. Instances holding no other reference let them be freed.
+
+    :param keys:    Keys or metric instances to release. Releases everything if empty.
+    """
+    with _LOCK:
+        if not keys:
+            _MODELS.clear()
+            _LOADING.clear()
+            return
+
+        for key in keys:
+            key = getattr(key, 'model_key', key)
+            _MODELS.pop(key, None)
+            _LOADING.pop(key, None)
+
+
+def loaded_models() -> list[Hashable]:
+    """Returns the keys of the models currently held in the registry."""
+    return list(_MODELS)
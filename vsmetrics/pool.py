@@ -0,0 +1,176 @@
+import importlib.util
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from numpy.typing import NDArray
+
+# planes in a slot start on cache line boundaries
+_ALIGNMENT = 64
+
+
+class ProcessPool:
+    """
+    Runs the per-frame kernel of a ``ModifyFrame`` metric (Blur, LocaLBinaryPattern, GLCM, Sharpness,
+    BRISQUE, SVD, VIF, Hash_3117, LPIPS) in worker processes instead of under the GIL of the main one.
+
+    Each frame in flight copies its planes into a reusable shared memory slot; workers map the slot
+    and only the scalar props travel back. The metric is pickled once and handed to the workers
+    when the first frame is requested, so it must be configured with ``calculate()`` by then.
+
+    Scripts using it need an ``if __name__ == '__main__':`` guard, as workers are spawned.
+
+        >>> metric = GLCM(levels=32)
+        >>> node = metric.calculate(clip, planes=[0, 1, 2])
+        >>> with ProcessPool(metric, workers=16):
+        ...     node.write_csv('glcm.csv')
+
+    :param metric:              Metric instance, or the MetricVideoNode returned by its ``calculate()``.
+    :param workers:             Number of worker processes. Defaults to the CPU count.
+    :param threads_per_worker:  Thread limit for BLAS, OpenMP, OpenCV and torch inside each worker, e.g. 1 with
+                                many workers. numpy's BLAS is loaded before the limit can be set and is only
+                                resized when threadpoolctl is installed. None leaves the libraries' defaults.
+    """
+    def __init__(self, metric, workers: int | None = None, threads_per_worker: int | None = None):
+        self.metric = getattr(metric, '_metric', metric)
+        self.workers = workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker
+
+        self._lock = threading.Lock()
+        self._executors: list[ProcessPoolExecutor] = []
+        self._slots: list[SharedMemory] = []
+        self._free: list[SharedMemory] = []
+        self._finalizer = weakref.finalize(self, _shutdown, self._executors, self._slots)
+
+        self.metric._executor = self
+
+    def submit(self, arrays: list[NDArray]) -> dict[str, float]:
+        """
+        Scores one frame in a worker and returns its props. Called from the metric's ``_process_frame``.
+        """
+        layout, size = [], 0
+
+        for array in arrays:
+            layout.append((size, array.shape, array.dtype.str))
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        slot = self._acquire(size)
+
+        try:
+            for (offset, shape, dtype), array in zip(layout, arrays):
+                np.copyto(np.ndarray(shape, dtype, buffer=slot.buf, offset=offset), array)
+
+            return self._executor().submit(_score, slot.name, layout).result()
+        finally:
+            with self._lock:
+                self._free.append(slot)
+
+    def close(self) -> None:
+        """Stops the workers and frees the shared memory. The metric goes back to scoring in-process."""
+        if self.metric._executor is self:
+            self.metric._executor = None
+
+        self._finalizer()
+
+    def __enter__(self) -> "ProcessPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _acquire(self, size: int) -> SharedMemory:
+        """
+        Takes a free slot that fits, or creates one. There is one slot per frame in flight,
+        so their number settles at the core's thread count.
+        """
+        with self._lock:
+            for i, slot in enumerate(self._free):
+                if slot.size >= size:
+                    return self._free.pop(i)
+
+            slot = SharedMemory(create=True, size=max(size, 1))
+            self._slots.append(slot)
+
+            return slot
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if not self._executors:
+                self._executors.append(ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_initialize,
+                    initargs=(pickle.dumps(self.metric), self.threads_per_worker)
+                ))
+
+            return self._executors[0]
+
+
+def _shutdown(executors: list[ProcessPoolExecutor], slots: list[SharedMemory]) -> None:
+    for executor in executors:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    for slot in slots:
+        slot.close()
+        slot.unlink()
+
+    executors.clear()
+    slots.clear()
+
+
+# worker process state
+_metric = None
+_segments: dict[str, SharedMemory] = {}
+
+
+def _initialize(payload: bytes, threads: int | None) -> None:
+    global _metric
+
+    if threads is not None:
+        # the variables cover the libraries the metric loads later
+        for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ[variable] = str(threads)
+
+        # numpy's BLAS was loaded along with this module, so its pool is already sized
+        # and only threadpoolctl can shrink it
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            pass
+        else:
+            threadpool_limits(threads)
+
+    _metric = pickle.loads(payload)
+
+    if threads is not None:
+        if importlib.util.find_spec('cv2') is not None:
+            import cv2
+            cv2.setNumThreads(threads)
+
+        if 'torch' in sys.modules:
+            sys.modules['torch'].set_num_threads(threads)
+
+
+def _attach(name: str) -> SharedMemory:
+    segment = _segments.get(name)
+
+    if segment is None:
+        # spawned workers share the parent's resource tracker, which already knows the segment,
+        # so attaching registers nothing new and the parent's unlink stays the only cleanup
+        segment = SharedMemory(name=name)
+        _segments[name] = segment
+
+    return segment
+
+
+def _score(name: str, layout: list[tuple[int, tuple[int, ...], str]]) -> dict[str, float]:
+    segment = _attach(name)
+    arrays = [np.ndarray(shape, dtype, buffer=segment.buf, offset=offset) for offset, shape, dtype in layout]
+
+    return _metric._frame_props(arrays)  # type: ignore
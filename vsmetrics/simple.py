@@ -1,7 +1,6 @@
 from enum import Enum
 from vsmasktools import Prewitt, PrewittTCanny
-from vstools import vs, merge_clip_props, split, plane
-from mvsfunc import PlaneStatistics, PlaneCompare
+from vstools import vs, core, merge_clip_props, split, plane
 from .meta import BaseUtil, MetricVideoNode
 
 class Edge(BaseUtil):
@@ -40,11 +39,209 @@ class Edge(BaseUtil):
 
         self.props = updated_props
 
-        return MetricVideoNode(merge, self)
+        return MetricVideoNode(merge, self, inputs=[reference])
+
+
+class NoReferenceStatistics(BaseUtil):
+    """
+    Plane mean, mean absolute deviation, variance, standard deviation and RMS for any set of planes, emitted together.
+
+    All planes share one PlaneStats chain for the means and, when needed, one Expr each for the absolute
+    and squared deviations, so each plane is read at most three times however many moments are requested.
+    RMS follows from the mean and variance. Integer clips are normalised to 0-1, like PlaneStats.
+    """
+    MOMENTS: dict[str, str] = {
+        'mean': 'PlaneMean',
+        'mad': 'PlaneMAD',
+        'var': 'PlaneVar',
+        'std': 'PlaneStd',
+        'rms': 'PlaneRMS',
+    }
+
+    def __init__(self, mean: bool = True, mad: bool = True, var: bool = True, std: bool = True, rms: bool = True):
+        self.mean = mean
+        self.mad = mad
+        self.var = var
+        self.std = std
+        self.rms = rms
+
+    @property
+    def moments(self) -> list[str]:
+        return [moment for moment in self.MOMENTS if getattr(self, moment)]
+
+    @property
+    def props(self) -> list[str]:
+        return [self.MOMENTS[moment] for moment in self.moments]
+
+    def calculate(self, reference: vs.VideoNode, planes: list[int] | int = [0, 1, 2]) -> vs.VideoNode | MetricVideoNode:
+        return MetricVideoNode(self._statistics(reference, planes), self, inputs=[reference])
+
+    def get_props(self) -> list[str]:
+        return getattr(self, 'output_props', self.props)
+
+    def _statistics(self, reference: vs.VideoNode, planes: list[int] | int) -> vs.VideoNode:
+        if reference.format.color_family == vs.GRAY:  # type: ignore
+            planes = [0]
+
+        planes = self.planes = self._normalise_planes(planes)
+        self.output_props = self._generate_props(self.props, reference.format.color_family, planes)  # type: ignore
+
+        fmt = reference.format
+        num_planes = fmt.num_planes  # type: ignore
+        scale = '' if fmt.sample_type == vs.FLOAT else f'{1 / ((1 << fmt.bits_per_sample) - 1)} *'  # type: ignore
+        float_format = fmt.replace(sample_type=vs.FLOAT, bits_per_sample=32).id  # type: ignore
+
+        means = reference
+        for p in planes:
+            means = means.std.PlaneStats(plane=p, prop=f'StatsMean{p}')
+
+        def deviation(expr: str, prop: str) -> vs.VideoNode:
+            clip = means.akarin.Expr([
+                f'x {scale} x.StatsMean{p}Average - {expr}' if p in planes else ''
+                for p in range(num_planes)
+            ], format=float_format)
+
+            for p in planes:
+                clip = clip.std.PlaneStats(plane=p, prop=f'{prop}{p}')
+
+            return clip
+
+        clips = [reference, means]
+
+        if self.mad:
+            clips.append(deviation('abs', 'StatsAbs'))
+
+        if self.var or self.std or self.rms:
+            clips.append(deviation('dup *', 'StatsSq'))
+
+        # x: reference, y: means, then the deviation clips in the order above
+        sq = 'z' if not self.mad else 'a'
+
+        def moment(name: str, p: int) -> str:
+            return {
+                'mean': f'y.StatsMean{p}Average',
+                'mad': f'z.StatsAbs{p}Average',
+                'var': f'{sq}.StatsSq{p}Average',
+                'std': f'{sq}.StatsSq{p}Average sqrt',
+                'rms': f'{sq}.StatsSq{p}Average y.StatsMean{p}Average dup * + sqrt',
+            }[name]
+
+        pairs = [(name, p) for name in self.moments for p in planes]
+
+        return core.akarin.PropExpr(clips, lambda: {
+            prop: moment(name, p) for prop, (name, p) in zip(self.output_props, pairs)
+        })
+
+
+class FullReferenceStatistics(BaseUtil):
+    """
+    MAE, RMSE, covariance, correlation and PSNR between reference and distorted planes, for any set of planes, emitted together.
+
+    One PlaneStats chain over the pair gives the reference means and the MAE, a second one the distorted means.
+    Covariance and correlation add Exprs for the centred cross and square terms, and the MSE behind RMSE and PSNR
+    is derived from those when they exist: ``mse = var_x + var_y - 2 cov + (mean_x - mean_y)^2``.
+    Integer clips are normalised to 0-1, like PlaneStats, so PSNR uses a peak of 1.
+    """
+    MOMENTS: dict[str, str] = {
+        'mae': 'PlaneMAE',
+        'rmse': 'PlaneRMSE',
+        'cov': 'PlaneCov',
+        'corr': 'PlaneCorr',
+        'psnr': 'PlanePSNR',
+    }
+
+    def __init__(self, mae: bool = True, rmse: bool = True, cov: bool = True, corr: bool = True, psnr: bool = True):
+        self.mae = mae
+        self.rmse = rmse
+        self.cov = cov
+        self.corr = corr
+        self.psnr = psnr
+
+    @property
+    def moments(self) -> list[str]:
+        return [moment for moment in self.MOMENTS if getattr(self, moment)]
+
+    @property
+    def props(self) -> list[str]:
+        return [self.MOMENTS[moment] for moment in self.moments]
+
+    def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode, planes: list[int] | int = [0, 1, 2]) -> vs.VideoNode | MetricVideoNode:
+        return MetricVideoNode(self._statistics(reference, distorted, planes), self, inputs=[reference, distorted])
+
+    def get_props(self) -> list[str]:
+        return getattr(self, 'output_props', self.props)
+
+    def _statistics(self, reference: vs.VideoNode, distorted: vs.VideoNode, planes: list[int] | int) -> vs.VideoNode:
+        if reference.format.color_family == vs.GRAY:  # type: ignore
+            planes = [0]
+
+        planes = self.planes = self._normalise_planes(planes)
+        self.output_props = self._generate_props(self.props, reference.format.color_family, planes)  # type: ignore
+
+        fmt = reference.format
+        num_planes = fmt.num_planes  # type: ignore
+        scale = '' if fmt.sample_type == vs.FLOAT else f'{1 / ((1 << fmt.bits_per_sample) - 1)} *'  # type: ignore
+        float_format = fmt.replace(sample_type=vs.FLOAT, bits_per_sample=32).id  # type: ignore
+
+        ref_stats, dist_stats = reference, distorted
+        for p in planes:
+            ref_stats = core.std.PlaneStats(ref_stats, distorted, plane=p, prop=f'StatsRef{p}')
+            dist_stats = dist_stats.std.PlaneStats(plane=p, prop=f'StatsDist{p}')
+
+        # x: reference, y: reference means and MAE, z: distorted means if centred terms are needed, then the Exprs below
+        clips = [reference, ref_stats]
+
+        if self.cov or self.corr:
+            clips.append(dist_stats)
+
+        letters = iter('zabcdefgh'[len(clips) - 2:])
+        terms: dict[str, str] = {}
+
+        def average(name: str, clip_list: list[vs.VideoNode], expr: str) -> None:
+            clip = core.akarin.Expr(clip_list, [
+                expr.format(p=p) if p in planes else '' for p in range(num_planes)
+            ], format=float_format)
+
+            for p in planes:
+                clip = clip.std.PlaneStats(plane=p, prop=f'Stats{name}{p}')
+
+            clips.append(clip)
+            terms[name] = f'{next(letters)}.Stats{name}{{p}}Average'
+
+        dx = f'x {scale} x.StatsRef{{p}}Average -'
+        dy = f'y {scale} y.StatsDist{{p}}Average -'
+
+        if self.cov or self.corr:
+            average('Cross', [ref_stats, dist_stats], f'{dx} {dy} *')
+
+        if self.corr:
+            average('RefSq', [ref_stats], f'{dx} dup *')
+            average('DistSq', [dist_stats], f'x {scale} x.StatsDist{{p}}Average - dup *')
+
+        if self.rmse or self.psnr:
+            if 'RefSq' in terms:
+                means = 'y.StatsRef{p}Average z.StatsDist{p}Average - dup *'
+                terms['MSE'] = f'{terms["RefSq"]} {terms["DistSq"]} + {terms["Cross"]} 2 * - {means} +'
+            else:
+                average('MSE', [reference, distorted], f'x {scale} y {scale} - dup *')
+
+        def moment(name: str, p: int) -> str:
+            return {
+                'mae': 'y.StatsRef{p}Diff',
+                'rmse': f'{terms.get("MSE")} sqrt',
+                'cov': f'{terms.get("Cross")}',
+                'corr': f'{terms.get("Cross")} {terms.get("RefSq")} {terms.get("DistSq")} * sqrt /',
+                # 10 / ln(10)
+                'psnr': f'{terms.get("MSE")} log -4.342944819032518 *',
+            }[name].format(p=p)
+
+        pairs = [(name, p) for name in self.moments for p in planes]
+
+        return core.akarin.PropExpr(clips, lambda: {
+            prop: moment(name, p) for prop, (name, p) in zip(self.output_props, pairs)
+        })
 
 
-# TODO
-# COME UP WITH SOME WAY TO HANDLE SUBCLASSES REQUESTING DIFFERENT PLANES
 class MetricsWrapper:
     def __init__(self, plane: int = 0):
         self.plane = plane
@@ -54,37 +251,30 @@ class MetricsWrapper:
         raise NotImplementedError("props must be defined in subclass")
 
 class NoReferenceWrapper(MetricsWrapper):
+    """Single statistic of a single plane, as a view over NoReferenceStatistics."""
     def calculate(self, reference: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
-        # bypass bug in function
-        _reference = plane(reference, self.plane)
-
-        calculate = PlaneStatistics(
-            clip=_reference,
-            mean=getattr(self, 'mean', False),
-            mad=getattr(self, 'mad', False),
-            var=getattr(self, 'var', False),
-            std=getattr(self, 'std', False),
-            rms=getattr(self, 'rms', False)
-        )  # type: ignore
-        
-        clip = reference.std.CopyFrameProps(calculate)  # type: ignore
-        return MetricVideoNode(clip, self)
+        statistics = NoReferenceStatistics(**{
+            moment: getattr(self, moment, False) for moment in NoReferenceStatistics.MOMENTS
+        })
+
+        # a single GRAY plane keeps the prop names unsuffixed
+        calculate = statistics._statistics(plane(reference, self.plane), 0)
+
+        clip = reference.std.CopyFrameProps(calculate, props=self.props)  # type: ignore
+        return MetricVideoNode(clip, self, inputs=[reference])
 
 class FullReferenceWrapper(MetricsWrapper):
+    """Single comparison of a single plane, as a view over FullReferenceStatistics."""
     def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
+        statistics = FullReferenceStatistics(**{
+            moment: getattr(self, moment, False) for moment in FullReferenceStatistics.MOMENTS
+        })
 
-        clip = PlaneCompare(
-            clip1=reference,
-            clip2=distorted,
-            plane=self.plane,
-            mae=getattr(self, 'mae', False),
-            rmse=getattr(self, 'rmse', False),
-            cov=getattr(self, 'cov', False),
-            corr=getattr(self, 'corr', False),
-            psnr=False
-        )
+        # single GRAY planes keep the prop names unsuffixed
+        calculate = statistics._statistics(plane(reference, self.plane), plane(distorted, self.plane), 0)
 
-        return MetricVideoNode(clip, self)
+        clip = reference.std.CopyFrameProps(calculate, props=self.props)  # type: ignore
+        return MetricVideoNode(clip, self, inputs=[reference, distorted])
 
 class Mean(NoReferenceWrapper):
     mean = True
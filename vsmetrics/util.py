@@ -106,6 +106,6 @@ def pre_process(
         
             reference = core.std.Interleave(ref_clips)
             distorted = core.std.Interleave(dis_clips)
-            
-            return reference, distorted  # type: ignore
+
+    return reference, distorted  # type: ignore
 
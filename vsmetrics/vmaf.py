@@ -1,9 +1,15 @@
-from datetime import datetime
+from __future__ import annotations
+
+from copy import copy
 import os
+import tempfile
+from typing import TYPE_CHECKING
 from vstools import vs, core, clip_async_render
-from pathlib import Path
 from .util import name, validate_format
-from .meta import MetricVideoNode
+from .meta import MetricVideoNode, read_results, resolve_async_requests
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class VMAFMetric:
     feature_id: int
@@ -40,7 +46,7 @@ class VMAFMetric:
             reference=reference, distorted=distorted, feature=self.feature_id  # type: ignore
         )
 
-        return MetricVideoNode(clip, self)
+        return MetricVideoNode(clip, self, inputs=[reference, distorted])
 
     @property
     def props(self) -> list[str]:
@@ -113,8 +119,52 @@ class CAMBI:
         self.tvi_threshold = tvi_threshold
         self.scaling = scaling
         self.cambi: vs.VideoNode
+        self._node: CAMBI.CAMBIVideoNode | None = None
+
+    class CAMBIVideoNode(MetricVideoNode):
+        """
+        Scores of a single CAMBI pass. The scale maps and banding masks are views on the same pass,
+        built on first use and kept for the node's lifetime.
+        """
+        def __init__(self, clip: vs.VideoNode, metric, reference: vs.VideoNode):
+            super().__init__(clip, metric, inputs=[reference])
+            self._scale_maps: list[vs.VideoNode] | None = None
+            self._masks: dict[tuple, vs.VideoNode] = {}
+
+        def scale_maps(self) -> list[vs.VideoNode]:
+            """The five per-scale c-score maps, at the resolution CAMBI computed each of them at."""
+            if self._scale_maps is None:
+                self._scale_maps = [self._clip.std.PropToClip('CAMBI_SCALE%d' % i) for i in range(5)]
+
+            return self._scale_maps
+
+        def mask(self, scale: int = 2, kernel=None) -> vs.VideoNode:
+            """
+            Merges the scale maps into a banding mask at the clip's resolution, carrying the CAMBI props.
+
+            :param scale:   The scale factor for the merging operation.
+            :param kernel:  Kernel used to upscale the scale maps. Default: Point.
+            """
+            from vsexprtools import combine, ExprOp
+            from vskernels import Point
+            from vstools import merge_clip_props
+
+            kernel = kernel or Point
+            key = (scale, kernel)
+
+            if key not in self._masks:
+                cambi_masks = [kernel.scale(i, self._clip.width, self._clip.height) for i in self.scale_maps()]
+
+                banding_mask = combine(
+                    cambi_masks, ExprOp.ADD, zip(range(1, 6), ExprOp.LOG, ExprOp.MUL),
+                    expr_suffix=[ExprOp.SQRT, scale, ExprOp.LOG, ExprOp.MUL]
+                ).std.Convolution([1, 2, 1, 2, 4, 2, 1, 2, 1])
+
+                self._masks[key] = merge_clip_props(banding_mask, self._clip)
 
-    def calculate(self, reference: vs.VideoNode) -> vs.VideoNode | MetricVideoNode:
+            return self._masks[key]
+
+    def calculate(self, reference: vs.VideoNode) -> CAMBIVideoNode:
         """
         :param clip:               Input clip. Must be in Grayscale or YUV format with integer sample type of 8/10 bit depth (subsampling can be arbitrary as cambi only uses the Y channel).
         """
@@ -129,63 +179,142 @@ class CAMBI:
             scores=True
         )
 
-        return MetricVideoNode(self.cambi, self)
+        self._node = self.CAMBIVideoNode(self.cambi, self, reference)
+
+        return self._node
 
     def mask(self, merge: bool = True) -> list[vs.VideoNode] | vs.VideoNode:
-        if self.cambi:
-            obj =  [self.cambi.std.PropToClip('CAMBI_SCALE%d' % i) for i in range(5)]
-        
-            if merge:
-                from vsexprtools import combine, ExprOp
-                from vskernels import Point
-                cambi_masks = [Point.scale(i, self.cambi.width, self.cambi.height) for i in obj]
+        """
+        The banding mask, or the scale maps if ``merge`` is False, of the last ``calculate()`` call.
+        """
+        if self._node is None:
+            raise ValueError("Cambi object not yet created. Call calculate() first.")
 
-                scale = 2
-                banding_mask = combine(
-                    cambi_masks, ExprOp.ADD, zip(range(1, 6), ExprOp.LOG, ExprOp.MUL),
-                    expr_suffix=[ExprOp.SQRT, scale, ExprOp.LOG, ExprOp.MUL]
-                ).std.Convolution([1, 2, 1, 2, 4, 2, 1, 2, 1])
+        return self._node.mask() if merge else self._node.scale_maps()
 
-                return banding_mask
 
-            return obj
-        else:
-            raise ValueError("Cambi object not yet created. Call calculate() first.")
+class VMAF:
+    """
+    Scores clips with libvmaf through the plugin's log rather than frame props.
 
+    The log is written as CSV to a temporary file, in memory-backed storage where there is some,
+    read back into the returned node once the clip has been rendered and then deleted.
 
-# .eval method hack
-# write vmaf to file in frameeval
-# probably slow!
-class VMAF:
-    def get_log_path(self, method_name: str):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    :param model:       libvmaf model index or indices passed to the plugin. Default: 1 (vmaf_v0.6.1neg).
+    :param features:    Extra feature indices computed alongside the model, e.g. 0 for PSNR or 2 for SSIM.
+    :param threads:     libvmaf thread count, for plugin builds that accept one. None leaves the plugin's default.
+    :param log_path:    Keep the log at this path instead of a temporary file.
+    """
+    props: list[str] = [
+        'vmaf'
+    ]
+
+    def __init__(
+        self,
+        model: int | list[int] = 1,
+        features: list[int] | None = None,
+        threads: int | None = None,
+        log_path: str | None = None
+    ):
+        self.model = model
+        self.features = features
+        self.threads = threads
+        self.log_path = log_path
+
+    class VMAFLogVideoNode(MetricVideoNode):
+        props_on_frames = False
+
+        def __init__(self, clip: vs.VideoNode, metric, function: str, plugin_args: dict, log_path: str | None):
+            super().__init__(clip, metric, inputs=[value for value in plugin_args.values() if isinstance(value, vs.VideoNode)])
+            self._function = function
+            self._plugin_args = plugin_args
+            self._log_path = log_path
+
+        def _ensure_data(self) -> None:
+            """
+            Fills ``self._data`` from the score cache, or else renders the plugin once and reads its log.
+            Every column in the log becomes a prop.
+            """
+            if self._data is not None:
+                return
+
+            cached = self._load_cached()
+
+            if self._data is None:
+                self._data = self._read_log()
+
+                if cached is not None:
+                    cached[0].put(cached[1], {prop: self._data[prop].to_numpy(self.dtype) for prop in self._data.columns})
+
+            self._metric.props = list(self._data.columns)
 
-        subdir_name = ".vsmetrics"
+        def _read_log(self) -> pd.DataFrame:
+            log_path = self._log_path or _temp_log(self._function.lower())
 
-        subdir_path = os.path.join(os.getcwd(), subdir_name)
+            try:
+                clip = getattr(core.vmaf, self._function)(**self._plugin_args, log_path=log_path, log_format=2)
 
-        os.makedirs(subdir_path, exist_ok=True)
+                clip_async_render(
+                    clip,
+                    outfile=None,
+                    progress=f"calculating {self._function}",
+                    async_requests=resolve_async_requests(self.async_requests)
+                )
 
-        return Path(subdir_path) / f"{method_name}_{timestamp}.txt"
+                # the plugin only writes its log once the node is freed
+                del clip
 
-    def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> None:
-        log_path = self.get_log_path("vmaf")
+                data = read_results(log_path)
+            finally:
+                if self._log_path is None and os.path.exists(log_path):
+                    os.remove(log_path)
 
-        _vmaf = core.vmaf.VMAF(
+            # libvmaf ends every CSV line with a separator, which reads back as an unnamed column
+            return data.loc[:, ~data.columns.str.startswith('Unnamed')].astype(self.dtype)
+
+    def calculate(self, reference: vs.VideoNode, distorted: vs.VideoNode) -> VMAFLogVideoNode:
+        """
+        Scores ``distorted`` against ``reference``. Nothing is rendered until the scores are first read.
+        """
+        plugin_args = self._plugin_args(
+            'VMAF',
             reference=reference,
             distorted=distorted,
-            log_path=str(log_path),
-            model=1
-            )
+            model=self.model,
+            feature=self.features
+        )
+
+        return self._log_node(distorted, 'VMAF', plugin_args)
+
+    def cambi(self, reference: vs.VideoNode) -> VMAFLogVideoNode:
+        """
+        Scores banding in ``reference`` with libvmaf's CAMBI. Nothing is rendered until the scores are first read.
+        """
+        plugin_args = self._plugin_args('CAMBI', clip=reference)
+
+        return self._log_node(reference, 'CAMBI', plugin_args)
+
+    def _plugin_args(self, function: str, **args) -> dict:
+        if self.threads is not None:
+            if 'threads:' not in getattr(core.vmaf, function).signature:
+                raise ValueError(f"This build of vmaf.{function} does not accept a thread count.")
+
+            args['threads'] = self.threads
+
+        return {key: value for key, value in args.items() if value is not None}
+
+    def _log_node(self, clip: vs.VideoNode, function: str, plugin_args: dict) -> VMAFLogVideoNode:
+        # the props are only known once the log is read, so every node reports them on its own copy
+        metric = copy(self)
+        metric.props = [function.lower()]
+
+        return self.VMAFLogVideoNode(clip, metric, function, plugin_args, self.log_path)
 
-        clip_async_render(_vmaf, outfile=None, progress="calculating VMAF")
 
-    def cambi(self, reference: vs.VideoNode) -> None:
-        log_path = self.get_log_path("cambi")
+def _temp_log(prefix: str) -> str:
+    directory = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
 
-        _cambi = core.vmaf.CAMBI(
-            clip=reference,
-            log_path=str(log_path)
-            )
+    fd, path = tempfile.mkstemp(prefix=f'vsmetrics_{prefix}_', suffix='.csv', dir=directory)
+    os.close(fd)
 
-        clip_async_render(_cambi, outfile=None, progress="calculating CAMBI")
+    return path